@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import asyncio
+import logging
+from api.scripts import STORE
+from run_history import HISTORY
+from utils.sanitize_name import _sanitize_name
+
+logger = logging.getLogger("uvicorn.error")
+
+router = APIRouter()
+
+async def seed_last_runs():
+    """Called at start-up: listings show the last run of every script, including runs before this start."""
+    try:
+        STORE.seed_last_runs(await asyncio.to_thread(HISTORY.last_runs))
+    except Exception as e:
+        logger.warning(f"Could not read run history {HISTORY.path}: {e}")
+
+
+@router.get("/history/flaky")
+async def flaky_steps(min_runs: int = Query(5, alias="minRuns", ge=2), limit: int = Query(20, ge=1, le=500)):
+    """Steps of all scripts whose outcome changes most often between runs"""
+    return {"items": await asyncio.to_thread(HISTORY.flaky_steps, None, min_runs, limit)}
+
+
+@router.get("/history/slowest")
+async def slowest_steps(limit: int = Query(10, ge=1, le=500)):
+    """Steps of all scripts with the highest average duration"""
+    return {"items": await asyncio.to_thread(HISTORY.slowest_steps, None, limit)}
+
+
+@router.get("/history/{name}/runs")
+async def script_runs(name: str, limit: int = Query(50, ge=1, le=1000), before: Optional[float] = None):
+    """Most recent runs of a script, newest first; pass the oldest `started` as `before` for the next page"""
+    return {"items": await asyncio.to_thread(HISTORY.runs, _sanitize_name(name), limit, before)}
+
+
+@router.get("/history/{name}/runs/{run_id}")
+async def run_detail(name: str, run_id: int):
+    """Step results of one run of this script"""
+    steps = await asyncio.to_thread(HISTORY.run_steps, run_id, _sanitize_name(name))
+    if not steps:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"id": run_id, "steps": steps}
+
+
+@router.get("/history/{name}/trend")
+async def script_trend(name: str, days: int = Query(30, ge=1, le=3650)):
+    """Runs, failures and average/max duration per day"""
+    return {"items": await asyncio.to_thread(HISTORY.trend, _sanitize_name(name), days)}
+
+
+@router.get("/history/{name}/slowest")
+async def script_slowest(name: str, limit: int = Query(10, ge=1, le=500)):
+    """Steps of a script with the highest average duration"""
+    return {"items": await asyncio.to_thread(HISTORY.slowest_steps, _sanitize_name(name), limit)}
+
+
+@router.get("/history/{name}/flaky")
+async def script_flaky(name: str, min_runs: int = Query(5, alias="minRuns", ge=2), limit: int = Query(20, ge=1, le=500)):
+    """Steps of a script whose outcome changes most often between runs"""
+    return {"items": await asyncio.to_thread(HISTORY.flaky_steps, _sanitize_name(name), min_runs, limit)}
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of action latencies, errors, connections and queue depth"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
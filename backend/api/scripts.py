@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from pathlib import Path
+from typing import Any, Optional
+import asyncio
+import hashlib
 import json
+from script_store import ScriptStore, atomic_write_text
+from step_retry import FLAKE_STATS
 from utils.sanitize_name import _sanitize_name
 
 router = APIRouter()
@@ -10,10 +15,26 @@ router = APIRouter()
 SCRIPTS_DIR = Path(__file__).parent.parent / "scripts"
 SCRIPTS_DIR.mkdir(exist_ok=True)
 
+# Index over SCRIPTS_DIR used by the routes below
+STORE = ScriptStore(SCRIPTS_DIR)
+
 
 class ScriptPayload(BaseModel):
     name: str
     steps: list
+    # None keeps the stored tags (the extension's save does not send them)
+    tags: Optional[list] = None
+    # Routing profile applied when the script runs (name or inline spec); None keeps the stored one
+    routing: Optional[Any] = None
+
+
+class RollbackPayload(BaseModel):
+    rev: int
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    match = request.headers.get("if-none-match")
+    return bool(match) and (match.strip() == "*" or etag in [m.strip() for m in match.split(",")])
 
 
 def _generate_playwright_code(name: str, steps: list) -> str:
@@ -103,35 +124,59 @@ def _generate_playwright_code(name: str, steps: list) -> str:
 
 
 @router.get("/scripts")
-async def list_scripts():
-    items = []
-    for p in SCRIPTS_DIR.glob("*.json"):
-        try:
-            stat = p.stat()
-            items.append({"name": p.stem, "mtime": stat.st_mtime})
-        except Exception:
-            continue
-    items.sort(key=lambda x: x["name"].lower())
-    return {"items": items}
+async def list_scripts(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    tag: Optional[str] = None,
+    action: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+):
+    offset = max(0, offset)
+    # A cold or invalidated index parses changed files; keep that off the event loop
+    etag = await asyncio.to_thread(STORE.listing_etag, q, tag, action, offset, limit)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    matches = await asyncio.to_thread(STORE.query, q, tag, action)
+    page = matches[offset:offset + limit] if limit is not None and limit >= 0 else matches[offset:]
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return {"items": [e.summary() for e in page], "total": len(matches), "offset": offset, "limit": limit}
 
 
 @router.get("/scripts/{name}")
-async def get_script(name: str):
+async def get_script(name: str, request: Request, response: Response):
     safe = _sanitize_name(name)
-    fp = SCRIPTS_DIR / f"{safe}.json"
-    if not fp.exists():
+    entry = await asyncio.to_thread(STORE.get, safe)
+    if entry is None:
+        if (SCRIPTS_DIR / f"{safe}.json").exists():
+            raise HTTPException(status_code=500, detail="Failed to read script")
         raise HTTPException(status_code=404, detail="Not found")
-    try:
-        data = json.loads(fp.read_text("utf-8"))
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to read script")
-    return data
+    if _not_modified(request, entry.etag):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    response.headers["ETag"] = entry.etag
+    response.headers["Cache-Control"] = "no-cache"
+    return entry.data
+
+
+def steps_hash(steps: list) -> str:
+    return hashlib.sha1(json.dumps(steps, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _persist(safe: str, data: dict) -> dict:
+    # Runs in a worker thread: file I/O and spec generation stay off the event loop
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    changed, steps_changed, rev = STORE.write(safe, text, steps_hash(data["steps"]))
+    spec_fp = SCRIPTS_DIR / f"{safe}.spec.js"
+    if steps_changed or not spec_fp.exists():
+        atomic_write_text(spec_fp, _generate_playwright_code(safe, data["steps"]))
+    return {"ok": True, "name": safe, "rev": rev, "changed": changed}
 
 
 @router.post("/scripts")
 async def save_script(payload: ScriptPayload):
     safe = _sanitize_name(payload.name)
-    fp = SCRIPTS_DIR / f"{safe}.json"
 
     # Clean steps to store only relevant fields
     cleaned = []
@@ -156,15 +201,52 @@ async def save_script(payload: ScriptPayload):
             cleaned.append(s)
 
     data = {"name": safe, "steps": cleaned}
+    stored = await asyncio.to_thread(STORE.get, safe)
+    stored_data = stored.data if stored else {}
+    raw_tags = stored_data.get("tags") if payload.tags is None else payload.tags
+    tags = [t.strip() for t in (raw_tags or []) if isinstance(t, str) and t.strip()]
+    if tags:
+        data["tags"] = tags
+    routing = stored_data.get("routing") if payload.routing is None else payload.routing
+    if routing is not None:
+        data["routing"] = routing
     try:
-        # Save JSON file
-        fp.write_text(json.dumps(data, ensure_ascii=False, indent=2), "utf-8")
-        
-        # Also save as Playwright test file
-        playwright_fp = SCRIPTS_DIR / f"{safe}.spec.js"
-        playwright_code = _generate_playwright_code(safe, cleaned)
-        playwright_fp.write_text(playwright_code, "utf-8")
-        
+        # JSON file plus the generated Playwright test file
+        return await asyncio.to_thread(_persist, safe, data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save: {e}")
-    return {"ok": True, "name": safe}
+
+
+@router.get("/scripts/{name}/revisions")
+async def list_revisions(name: str):
+    safe = _sanitize_name(name)
+    history = await asyncio.to_thread(STORE.revisions, safe)
+    if not history:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"items": [{"rev": r["rev"], "at": r["at"], "stepsHash": r["stepsHash"]} for r in history]}
+
+
+@router.post("/scripts/{name}/rollback")
+async def rollback_script(name: str, payload: RollbackPayload):
+    safe = _sanitize_name(name)
+    try:
+        text = await asyncio.to_thread(STORE.text_at, safe, payload.rev)
+    except (KeyError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail=f"Revision {payload.rev} not found")
+    try:
+        # Restoring is itself a new revision, so a rollback can be undone
+        return await asyncio.to_thread(_persist, safe, json.loads(text))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to roll back: {e}")
+
+
+@router.get("/scripts/{name}/flakes")
+async def script_flakes(name: str):
+    """Per-step retry/flake counters of a saved script, with the timeout a flaky step now runs with."""
+    safe = _sanitize_name(name)
+    stats = await asyncio.to_thread(FLAKE_STATS.snapshot, f"{safe}#")
+    return {
+        "items": [
+            {"step": key.split("#", 1)[1], **entry} for key, entry in sorted(stats.items())
+        ]
+    }
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from playwright_manager import get_startup_status
+from loop_monitor import LOOP_MONITOR
+
+router = APIRouter()
+
+
+@router.get("/status")
+async def status():
+    """Browser state, startup phase timings (cold-start latency) and recent event-loop lag"""
+    return {**get_startup_status(), "eventLoop": LOOP_MONITOR.snapshot()}
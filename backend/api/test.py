@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import HTMLResponse
+from html import escape
 from pathlib import Path
 
 router = APIRouter()
 
+# Upper bounds so a fixture URL cannot make the server build arbitrarily large pages
+MAX_ROWS = 100000
+MAX_DEPTH = 20
+MAX_FIELDS = 5000
+
 
 @router.get("/test", response_class=HTMLResponse)
 async def test_page():
@@ -12,3 +18,49 @@ async def test_page():
     if not test_page_path.exists():
         raise HTTPException(status_code=404, detail="Test page not found")
     return HTMLResponse(content=test_page_path.read_text("utf-8"))
+
+
+# Heavy-DOM fixtures for benchmark.py; every page has #status, which the buttons update
+
+_SCRIPT = "<script>function done(text) { document.getElementById('status').textContent = text; }</script>"
+
+
+def _page(title: str, body: str) -> HTMLResponse:
+    return HTMLResponse(
+        f"<!doctype html><html><head><meta charset='utf-8'><title>{escape(title)}</title>{_SCRIPT}</head>"
+        f"<body><div id='status'>ready</div>{body}</body></html>"
+    )
+
+
+@router.get("/test/fixtures/table", response_class=HTMLResponse)
+async def fixture_table(rows: int = Query(10000, ge=1, le=MAX_ROWS)):
+    """A table with `rows` rows of five cells and a button per row."""
+    parts = ["<table id='grid'><thead><tr><th>#</th><th>Name</th><th>Email</th><th>Score</th><th></th></tr></thead><tbody>"]
+    for i in range(rows):
+        parts.append(
+            f"<tr data-row='{i}'><td>{i}</td><td class='name'>User {i}</td><td>user{i}@example.com</td>"
+            f"<td>{(i * 37) % 101}</td><td><button class='row-btn' onclick=\"done('row {i}')\">Open</button></td></tr>"
+        )
+    parts.append("</tbody></table>")
+    return _page(f"Table {rows}", "".join(parts))
+
+
+@router.get("/test/fixtures/iframes", response_class=HTMLResponse)
+async def fixture_iframes(depth: int = Query(5, ge=0, le=MAX_DEPTH)):
+    """An iframe nested `depth` levels deep; the innermost frame holds a form field and a button."""
+    if depth == 0:
+        body = "<input id='inner'><button id='innerBtn' onclick=\"done('inner')\">Inner</button>"
+    else:
+        body = f"<iframe id='frame{depth}' name='frame{depth}' src='/test/fixtures/iframes?depth={depth - 1}' width='600' height='200'></iframe>"
+    return _page(f"Frames {depth}", f"<p>Level {depth}</p>{body}")
+
+
+@router.get("/test/fixtures/form", response_class=HTMLResponse)
+async def fixture_form(fields: int = Query(500, ge=1, le=MAX_FIELDS)):
+    """A form with `fields` labelled inputs, a select and a submit button."""
+    parts = ["<form id='bigForm' onsubmit=\"event.preventDefault(); done('submitted')\">"]
+    for i in range(fields):
+        parts.append(f"<label for='field{i}'>Field {i}</label><input id='field{i}' name='field{i}'><br>")
+    options = "".join(f"<option value='o{i}'>Option {i}</option>" for i in range(50))
+    parts.append(f"<select id='choice'>{options}</select><button id='submit' type='submit'>Submit</button></form>")
+    return _page(f"Form {fields}", "".join(parts))
@@ -1,7 +1,13 @@
 from fastapi import WebSocket, WebSocketDisconnect
 from connection_manager import ConnectionManager
-from message_processor import process_message
+from command_scheduler import CommandScheduler
+from message_processor import process_message, READ_ONLY_ACTIONS, _build_cancelled, _build_error, _build_ok
+from playwright_manager import acquire_session, release_session, get_context_pool
+from protocol import Protocol
+import screencast
 import asyncio
+import json
+import time
 import logging
 
 logger = logging.getLogger("uvicorn.error")
@@ -10,14 +16,88 @@ logger = logging.getLogger("uvicorn.error")
 async def handle_websocket(websocket: WebSocket, manager: ConnectionManager):
     """Handle WebSocket connection"""
     await manager.connect(websocket)
+    session = None
+    scheduler = None
 
     try:
+        pool = get_context_pool()
+        if pool and pool.available <= 0:
+            await manager.send_personal_message(json.dumps({
+                "type": "status",
+                "status": "queued",
+                "message": "Waiting for a free browser context...",
+                "position": pool.waiting + 1,
+            }), websocket)
+        try:
+            session = await acquire_session()
+        except asyncio.TimeoutError:
+            logger.warning("No browser context became available for new connection")
+            await manager.send_personal_message(json.dumps({
+                "type": "error",
+                "message": "No browser context available, try again later"
+            }), websocket)
+            await manager.close(websocket, code=1013)
+            return
+
+        protocol = Protocol()
+
+        async def run(message):
+            await process_message(message, manager, websocket, session, protocol)
+
+        async def on_cancel(message):
+            await manager.send_frame(protocol.encode(_build_cancelled(message.get("id"))), websocket)
+
+        async def on_error(message, error):
+            await manager.send_frame(protocol.encode(
+                _build_error(message.get("id"), message.get("action") or "<none>", error, 0)
+            ), websocket)
+
+        scheduler = CommandScheduler(run, on_cancel, on_error, READ_ONLY_ACTIONS)
+
         while True:
-            # Wait for message from client
-            data = await websocket.receive_text()
-            # Process message asynchronously without waiting
-            asyncio.create_task(process_message(data, manager, websocket))
+            # Text frames are JSON; binary frames use the negotiated encoding (msgpack/CBOR)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = frame.get("text") if frame.get("text") is not None else frame.get("bytes")
+            try:
+                message = protocol.decode(data)
+            except Exception:
+                # Answered inline: nothing to schedule or cancel for a frame that cannot be read
+                logger.error("Received invalid JSON format from client")
+                await manager.send_frame(protocol.encode({"type": "error", "message": "Invalid JSON format"}), websocket)
+                continue
+
+            if isinstance(message, dict) and message.get("type") == "hello":
+                # Reply in JSON, then switch this connection to the chosen settings
+                reply = protocol.negotiate(message)
+                await manager.send_personal_message(json.dumps(reply), websocket)
+                manager.set_protocol(websocket, protocol)
+                continue
+
+            # Cancellation bypasses the queue so it can reach commands stuck behind others
+            if isinstance(message, dict) and message.get("action") == "cancel":
+                cancelled = scheduler.cancel(message.get("value"))
+                await manager.send_frame(protocol.encode(
+                    _build_ok(message.get("id"), {"cancelled": cancelled, "target": message.get("value")})
+                ), websocket)
+                continue
+
+            if not isinstance(message, dict):
+                message = {"action": None}
+            message["_received"] = time.perf_counter()
+            # Blocks only while the connection's inbox is full too (backpressure); cancel frames are read until then
+            await scheduler.submit(message)
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
+    finally:
         manager.disconnect(websocket)
+        try:
+            if scheduler:
+                await scheduler.close()
+        finally:
+            # Viewers of this connection are removed even if closing the scheduler failed
+            if session:
+                await screencast.unsubscribe_all(session)
+            await release_session(session)
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.latency import summarize
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+BASELINE_FILE = Path(__file__).parent / "bench_baseline.json"
+# A case regresses when its p95 exceeds the baseline by this share...
+DEFAULT_THRESHOLD = 0.2
+# ...and by at least this many ms, so sub-millisecond jitter never fails the gate
+DEFAULT_MIN_DELTA_MS = 2.0
+
+# Server settings for the benchmark: headless, clean profile, no initial navigation
+BENCH_ENV = {
+    "PLAYTEST_HEADLESS": "1",
+    "PLAYTEST_BROWSER_LAUNCH": "eager",
+    "PLAYTEST_PROFILE": "ephemeral",
+    "PLAYTEST_START_URL": "",
+}
+
+# name -> page to open first (None: stay) and the command that is timed
+CASES: List[Dict[str, Any]] = [
+    {"name": "roundtrip.getUrl", "page": "/test", "command": {"action": "getUrl"}},
+    {"name": "test.click", "page": "/test", "command": {"action": "click", "target": {"selector": "#simpleBtn"}}},
+    {"name": "test.fill", "page": "/test", "command": {"action": "fill", "target": {"selector": "#textInput"}, "value": "benchmark"}},
+    {"name": "test.expectTextContains", "page": "/test", "command": {
+        "action": "expectTextContains", "target": {"selector": "#textElement"}, "value": "text content"}},
+    {"name": "test.getText", "page": "/test", "command": {"action": "getText", "target": {"selector": "#textElement"}}},
+    {"name": "table.click", "page": "/test/fixtures/table?rows=10000", "command": {
+        "action": "click", "target": {"selector": "tr[data-row='9999'] .row-btn"}}},
+    {"name": "table.getText", "page": "/test/fixtures/table?rows=10000", "command": {
+        "action": "getText", "target": {"selector": "tr[data-row='5000'] .name"}}},
+    {"name": "table.expectTextContains", "page": "/test/fixtures/table?rows=10000", "command": {
+        "action": "expectTextContains", "target": {"selector": "#status"}, "value": "ready"}},
+    {"name": "form.fill", "page": "/test/fixtures/form?fields=2000", "command": {
+        "action": "fill", "target": {"selector": "#field1999"}, "value": "benchmark"}},
+    {"name": "form.selectOption", "page": "/test/fixtures/form?fields=2000", "command": {
+        "action": "selectOption", "target": {"selector": "#choice"}, "value": "o42"}},
+    {"name": "iframes.switchFrame", "page": "/test/fixtures/iframes?depth=10", "command": {
+        "action": "switchFrame", "options": {"name": "frame1"}}},
+    {"name": "iframes.goto", "page": None, "command": {
+        "action": "goto", "value": "{base}/test/fixtures/iframes?depth=10", "options": {"waitUntil": "load"}}},
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb() -> Optional[float]:
+    """Peak resident memory of this process (server and client share it)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class BenchClient:
+    """Minimal WebSocket client: JSON frames, results matched to requests by id."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._next_id = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for frame in self.ws:
+                if isinstance(frame, bytes):
+                    continue
+                message = json.loads(frame)
+                future = self._pending.pop(str(message.get("id")), None) if message.get("type") == "result" else None
+                if future and not future.done():
+                    future.set_result(message)
+        finally:
+            # Connection gone: fail whatever is still waiting instead of hanging
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("WebSocket closed"))
+            self._pending.clear()
+
+    async def send(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        if self._reader.done():
+            raise ConnectionError("WebSocket closed")
+        self._next_id += 1
+        message_id = f"b{self._next_id}"
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        await self.ws.send(json.dumps({**command, "id": message_id}))
+        return await future
+
+    async def close(self):
+        self._reader.cancel()
+        await self.ws.close()
+
+
+async def _check(client: BenchClient, command: Dict[str, Any]) -> Dict[str, Any]:
+    result = await client.send(command)
+    if result.get("status") != "ok":
+        raise RuntimeError(f"{command.get('action')} failed: {(result.get('error') or {}).get('message')}")
+    return result
+
+
+async def _js_heap_mb(client: BenchClient) -> Optional[float]:
+    result = await client.send({"action": "evalJs", "value": "performance.memory ? performance.memory.usedJSHeapSize : null"})
+    value = (result.get("details") or {}).get("value")
+    return round(value / (1024 * 1024), 1) if isinstance(value, (int, float)) else None
+
+
+async def run_case(client: BenchClient, case: Dict[str, Any], base: str, iterations: int, warmup: int) -> Dict[str, Any]:
+    if case.get("page"):
+        await _check(client, {"action": "goto", "value": base + case["page"], "options": {"waitUntil": "load"}})
+    command = json.loads(json.dumps(case["command"]).replace("{base}", base))
+    for _ in range(warmup):
+        await _check(client, command)
+    client_ms: List[float] = []
+    server_ms: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        sent = time.perf_counter()
+        result = await _check(client, command)
+        client_ms.append((time.perf_counter() - sent) * 1000)
+        server_ms.append(result["details"].get("elapsedMs", 0))
+    wall = time.perf_counter() - started
+    return {
+        "roundTripMs": summarize(client_ms),
+        "serverMs": summarize(server_ms),
+        "commandsPerSec": round(iterations / wall, 1) if wall else None,
+        "jsHeapMb": await _js_heap_mb(client),
+    }
+
+
+async def run_pipelined(client: BenchClient, base: str, count: int) -> Dict[str, Any]:
+    """Throughput with `count` read-only commands in flight at once."""
+    await _check(client, {"action": "goto", "value": base + "/test", "options": {"waitUntil": "load"}})
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client.send({"action": "getUrl"}) for _ in range(count)))
+    wall = time.perf_counter() - started
+    failed = sum(1 for r in results if r.get("status") != "ok")
+    return {"commands": count, "failed": failed, "commandsPerSec": round(count / wall, 1) if wall else None}
+
+
+async def run_benchmarks(iterations: int, warmup: int, pattern: Optional[str]) -> Dict[str, Any]:
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    # Imported after the environment is set: server modules read it at import time
+    import uvicorn
+    import websockets
+    from main import app
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    boot_started = time.perf_counter()
+    while not server.started:
+        if serving.done():
+            # Startup failed (e.g. no browser installed); surface the server's error
+            serving.result()
+            raise RuntimeError("Server stopped during startup")
+        await asyncio.sleep(0.05)
+    boot_ms = int((time.perf_counter() - boot_started) * 1000)
+
+    cases = [c for c in CASES if not pattern or pattern in c["name"]]
+    report: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "warmup": warmup,
+            "bootMs": boot_ms,
+            "locatorCache": os.environ.get("PLAYTEST_LOCATOR_CACHE") == "1",
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "cases": {},
+    }
+    try:
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}/ws", max_size=None)
+        client = BenchClient(ws)
+        try:
+            await ws.send(json.dumps({"type": "hello", "encodings": ["json"], "ack": False, "stack": False}))
+            for case in cases:
+                print(f"  {case['name']} ...", end="", flush=True)
+                report["cases"][case["name"]] = stats = await run_case(client, case, base, iterations, warmup)
+                print(f" p50 {stats['roundTripMs']['p50']} ms, p95 {stats['roundTripMs']['p95']} ms")
+            if not pattern or pattern in "roundtrip.pipelined":
+                report["pipelined"] = await run_pipelined(client, base, max(iterations, 100))
+        finally:
+            await client.close()
+    finally:
+        server.should_exit = True
+        await serving
+    report["meta"]["peakRssMb"] = _rss_mb()
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta_ms: float) -> List[str]:
+    """Cases whose round-trip p95 regressed against the baseline."""
+    regressions = []
+    for name, stats in report["cases"].items():
+        before = ((baseline.get("cases") or {}).get(name) or {}).get("roundTripMs", {}).get("p95")
+        now = stats["roundTripMs"]["p95"]
+        if before is None or now is None:
+            continue
+        if now > before * (1 + threshold) and now - before >= min_delta_ms:
+            regressions.append(f"{name}: p95 {now} ms vs baseline {before} ms (+{(now / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def deltas(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Round-trip p50/p95 of every case next to the baseline (e.g. to judge --locator-cache)."""
+    lines = []
+    for name, stats in report["cases"].items():
+        before = ((baseline.get("cases") or {}).get(name) or {}).get("roundTripMs") or {}
+        now = stats["roundTripMs"]
+        if before.get("p50") is None or now.get("p50") is None:
+            continue
+        lines.append(
+            f"{name:<28} p50 {before['p50']} -> {now['p50']} ms ({now['p50'] - before['p50']:+.2f}), "
+            f"p95 {before.get('p95')} -> {now.get('p95')} ms"
+        )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark actions against the bundled /test page and heavy-DOM fixtures.")
+    parser.add_argument("-n", "--iterations", type=int, default=50, help="Timed runs per case")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed runs per case before measuring")
+    parser.add_argument("-k", "--filter", help="Only run cases whose name contains this substring")
+    parser.add_argument("--json", dest="json_out", type=Path, help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed p95 increase (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="Ignore p95 increases smaller than this")
+    parser.add_argument("--locator-cache", action="store_true", help="Run the server with the element-handle cache (PLAYTEST_LOCATOR_CACHE=1)")
+    args = parser.parse_args(argv)
+    if args.locator_cache:
+        os.environ["PLAYTEST_LOCATOR_CACHE"] = "1"
+
+    print(f"Benchmarking ({args.iterations} iterations per case)...")
+    report = asyncio.run(run_benchmarks(args.iterations, args.warmup, args.filter))
+    if report.get("pipelined"):
+        print(f"  pipelined getUrl: {report['pipelined']['commandsPerSec']} commands/s")
+    print(f"Peak RSS: {report['meta']['peakRssMb']} MB")
+
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2), "utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2), "utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text("utf-8"))
+    for line in deltas(report, baseline):
+        print(f"  {line}")
+    regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+    for line in regressions:
+        print(f"❌ REGRESSION {line}")
+    if not regressions:
+        print("✅ No p95 regression against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
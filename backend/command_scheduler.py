@@ -0,0 +1,148 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from metrics import QUEUED_COMMANDS
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("uvicorn.error")
+
+# Commands executing at the same time per connection (only read-only ones can overlap)
+MAX_IN_FLIGHT = int(os.environ.get("PLAYTEST_MAX_IN_FLIGHT", "4"))
+# Commands accepted but not finished per connection; beyond this the socket is not read
+MAX_QUEUED = int(os.environ.get("PLAYTEST_MAX_QUEUED", "64"))
+
+
+class CommandScheduler:
+    """
+    Orders the commands of one connection.
+
+    Mutating commands run strictly in arrival order, each after everything submitted
+    before it. Read-only commands only wait for the preceding mutating command and may
+    overlap with each other, bounded by `max_in_flight`. Once `max_queued` commands
+    are outstanding, further ones wait in an inbox of the same size; `submit` blocks
+    only when that is full too, which stops reading from the socket and pushes
+    backpressure to the client. Until then the socket keeps being read, so `cancel`
+    reaches commands that are running, scheduled or still in the inbox.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Dict[str, Any]], Awaitable[None]],
+        on_cancel: Callable[[Dict[str, Any]], Awaitable[None]],
+        on_error: Callable[[Dict[str, Any], Exception], Awaitable[None]],
+        read_only_actions: Set[str],
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_queued: int = MAX_QUEUED,
+    ):
+        self._run = run
+        self._on_cancel = on_cancel
+        self._on_error = on_error
+        self._read_only = read_only_actions
+        self._running = asyncio.Semaphore(max(1, max_in_flight))
+        self._queued = asyncio.Semaphore(max(1, max_queued))
+        self._tasks: Dict[Any, asyncio.Task] = {}
+        self._last_write: Optional[asyncio.Task] = None
+        self._reads_since_write: List[asyncio.Task] = []
+        # Commands waiting for a queue slot, by id (so they can be cancelled before they start)
+        self._inbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max(1, max_queued))
+        self._waiting: Dict[Any, Dict[str, Any]] = {}
+        self._feeder: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks) + self._inbox.qsize()
+
+    async def submit(self, message: Dict[str, Any]):
+        """Accept a command; blocks only while the inbox is full."""
+        if self._feeder is None:
+            self._feeder = asyncio.create_task(self._feed())
+        if message.get("id") is not None:
+            self._waiting[message["id"]] = message
+        await self._inbox.put(message)
+
+    async def _feed(self):
+        while True:
+            # Slot first: a command stays cancellable in the inbox until it can actually be scheduled
+            await self._queued.acquire()
+            message = await self._inbox.get()
+            # A command cancelled while waiting was already answered by cancel()
+            if message.get("id") is not None and self._waiting.pop(message["id"], None) is None:
+                self._queued.release()
+                continue
+            self._schedule(message)
+
+    def _schedule(self, message: Dict[str, Any]):
+        if message.get("action") in self._read_only:
+            deps = [self._last_write] if self._last_write else []
+        else:
+            deps = ([self._last_write] if self._last_write else []) + self._reads_since_write
+
+        task = asyncio.create_task(self._execute(message, deps))
+        if message.get("action") in self._read_only:
+            # Finished reads are no longer anything to wait for; keeps read-only connections from piling them up
+            self._reads_since_write = [t for t in self._reads_since_write if not t.done()]
+            self._reads_since_write.append(task)
+        else:
+            self._last_write = task
+            self._reads_since_write = []
+
+        key = message.get("id")
+        if key is None:
+            key = object()
+        self._tasks[key] = task
+        QUEUED_COMMANDS.inc()
+
+        def _done(_):
+            self._tasks.pop(key, None)
+            self._queued.release()
+            QUEUED_COMMANDS.dec()
+
+        task.add_done_callback(_done)
+
+    async def _execute(self, message: Dict[str, Any], deps: List[asyncio.Task]):
+        try:
+            if deps:
+                # Only ordering matters here; a failed or cancelled predecessor does not block us
+                await asyncio.wait(deps)
+            async with self._running:
+                await self._run(message)
+        except asyncio.CancelledError:
+            if not self._closed:
+                try:
+                    await self._on_cancel(message)
+                except Exception:
+                    logger.warning("Failed to report cancelled command %s", message.get("id"))
+        except Exception as e:
+            # `run` reports command errors itself; this is a failure around it (e.g. sending the result)
+            logger.warning(f"Command {message.get('id')} failed outside its handler: {e}")
+            if not self._closed:
+                try:
+                    await self._on_error(message, e)
+                except Exception:
+                    logger.warning("Failed to report failed command %s", message.get("id"))
+
+    def cancel(self, message_id: Any) -> bool:
+        """Abort a waiting, queued or running command by id."""
+        message = self._waiting.pop(message_id, None)
+        if message is not None:
+            task = asyncio.create_task(self._on_cancel(message))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return True
+        task = self._tasks.get(message_id)
+        if not task or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def close(self):
+        """Cancel everything still outstanding (the socket is gone)."""
+        self._closed = True
+        if self._feeder:
+            self._feeder.cancel()
+        self._waiting.clear()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
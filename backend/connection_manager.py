@@ -1,33 +1,193 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Any, Dict, Optional, Union
+import asyncio
 import json
 import logging
+import os
+from metrics import ACTIVE_CONNECTIONS, SLOW_CONSUMER_EVENTS
 
 # Use Uvicorn's logger for colorized output
 logger = logging.getLogger("uvicorn.error")
 
+# Frames waiting to be written per connection
+OUTBOX_SIZE = int(os.environ.get("PLAYTEST_OUTBOX_SIZE", "256"))
+# What a broadcast does when a client's outbox is full: "drop" the frame for that client or "disconnect" it
+SLOW_CONSUMER_POLICY = os.environ.get("PLAYTEST_SLOW_CONSUMER", "drop")
+# Time given to a closing connection to flush frames already queued
+CLOSE_FLUSH_TIMEOUT = 2.0
+
+Frame = Union[str, bytes]
+_CLOSE = object()
+# Outcomes of _Outbox.offer
+QUEUED, FULL, CLOSED = "queued", "full", "closed"
+
+
+class _Outbox:
+    """Bounded queue of encoded frames plus the task that writes them to one socket."""
+
+    def __init__(self, websocket: WebSocket, size: int):
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max(1, size))
+        self.closed = False
+        self.dropped = 0
+        # Encoder negotiated for this connection (see protocol.Protocol); JSON until then
+        self.protocol = None
+        self.writer = asyncio.create_task(self._write())
+
+    async def _write(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is _CLOSE:
+                    return
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except Exception as e:
+            logger.debug(f"WebSocket writer stopped: {e}")
+        finally:
+            self.closed = True
+            # Unblock senders waiting for room in a queue nobody drains any more
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+    async def put(self, frame: Frame):
+        if self.closed:
+            raise ConnectionError("WebSocket connection is closed")
+        await self.queue.put(frame)
+
+    def offer(self, frame: Frame) -> str:
+        """Queue without waiting: QUEUED, FULL or CLOSED (nothing will be written any more)."""
+        if self.closed:
+            return CLOSED
+        try:
+            self.queue.put_nowait(frame)
+            return QUEUED
+        except asyncio.QueueFull:
+            return FULL
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.queue.put_nowait(_CLOSE)
+        except asyncio.QueueFull:
+            self.writer.cancel()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Registry of open connections, each with its own outbound queue and writer task.
+
+    Replies to a connection's own commands wait for room in its queue, so they are
+    never dropped. Broadcasts are encoded once and offered to every queue without
+    waiting; a full queue is handled by `slow_consumer_policy`, so a slow client
+    never delays the others or the command path.
+    """
+
+    def __init__(self, outbox_size: int = OUTBOX_SIZE, slow_consumer_policy: str = SLOW_CONSUMER_POLICY):
+        self.outbox_size = outbox_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self._outboxes: Dict[WebSocket, _Outbox] = {}
+
+    @property
+    def active_connections(self):
+        return list(self._outboxes)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+        self._outboxes[websocket] = _Outbox(websocket, self.outbox_size)
+        ACTIVE_CONNECTIONS.set(len(self._outboxes))
+        logger.info(f"Client connected. Total connections: {len(self._outboxes)}")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox is None:
+            return
+        outbox.close()
+        ACTIVE_CONNECTIONS.set(len(self._outboxes))
+        logger.info(f"Client disconnected. Total connections: {len(self._outboxes)}")
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
+    async def close(self, websocket: WebSocket, code: int = 1000):
+        """Flush what is queued for the client, then close the socket."""
+        outbox = self._outboxes.get(websocket)
+        self.disconnect(websocket)
+        if outbox is not None:
             try:
-                await connection.send_text(message)
-            except Exception:
-                # Remove dead connections
-                self.active_connections.remove(connection)
-                logger.warning("Removed a dead WebSocket connection during broadcast")
+                await asyncio.wait_for(asyncio.shield(outbox.writer), CLOSE_FLUSH_TIMEOUT)
+            except (asyncio.TimeoutError, Exception):
+                outbox.writer.cancel()
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def set_protocol(self, websocket: WebSocket, protocol):
+        outbox = self._outboxes.get(websocket)
+        if outbox is not None:
+            outbox.protocol = protocol
+
+    async def send_frame(self, frame: Frame, websocket: WebSocket) -> bool:
+        """
+        Queue an already encoded text or binary frame for one client. Returns False,
+        dropping the frame, once the client has disconnected.
+        """
+        outbox = self._outboxes.get(websocket)
+        if outbox is None:
+            # Not (or no longer) registered: the socket is gone or going
+            logger.debug("Dropping frame for a disconnected WebSocket")
+            return False
+        try:
+            await outbox.put(frame)
+        except ConnectionError:
+            logger.debug("Dropping frame for a closed WebSocket")
+            return False
+        return True
+
+    async def send_personal_message(self, message: str, websocket: WebSocket) -> bool:
+        return await self.send_frame(message, websocket)
+
+    async def send_personal_bytes(self, data: bytes, websocket: WebSocket) -> bool:
+        return await self.send_frame(data, websocket)
+
+    def broadcast_nowait(self, message: Union[str, bytes, Dict[str, Any]], exclude: Optional[WebSocket] = None) -> int:
+        """Encode once per wire encoding and queue for every connection; returns how many clients got it."""
+        frames: Dict[str, Frame] = {}
+        delivered = 0
+        # Iterate over a snapshot: the disconnect policy mutates the registry
+        for websocket, outbox in list(self._outboxes.items()):
+            if websocket is exclude:
+                continue
+            if isinstance(message, dict):
+                encoding = outbox.protocol.encoding if outbox.protocol else "json"
+                if encoding not in frames:
+                    frames[encoding] = outbox.protocol.encode(message) if outbox.protocol else json.dumps(message)
+                frame = frames[encoding]
+            else:
+                frame = message
+            outcome = outbox.offer(frame)
+            if outcome == QUEUED:
+                delivered += 1
+                continue
+            if outcome == CLOSED:
+                # Writer already stopped (socket gone): unregister instead of counting a slow consumer
+                self.disconnect(websocket)
+                continue
+            outbox.dropped += 1
+            SLOW_CONSUMER_EVENTS.inc(self.slow_consumer_policy)
+            if self.slow_consumer_policy == "disconnect":
+                logger.warning("Disconnecting slow WebSocket consumer (outbox full)")
+                self.disconnect(websocket)
+                asyncio.create_task(self._close_socket(websocket, 1008))
+        return delivered
+
+    async def broadcast(self, message: Union[str, bytes, Dict[str, Any]], exclude: Optional[WebSocket] = None) -> int:
+        return self.broadcast_nowait(message, exclude)
+
+    async def _close_socket(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Rows read ahead of the workers; bounds memory whatever the dataset size
+QUEUE_FACTOR = 2
+# Result lines written per batch
+WRITE_BATCH = 100
+# Dataset rows parsed per thread hop
+READ_CHUNK = 100
+
+
+def iter_rows(path: Path, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Rows of a CSV (header line = variable names) or JSONL file, read lazily.
+    JSONL lines must be objects; blank lines are skipped.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in itertools.islice(rows, offset, None if limit is None else offset + limit):
+            if not isinstance(row, dict):
+                raise ValueError(f"{path}: every JSONL line must be an object")
+            yield row
+
+
+class ResultWriter:
+    """Appends one JSON line per row; lines are batched and written off the event loop."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._task = asyncio.create_task(self._write())
+        return self
+
+    def add(self, record: Dict[str, Any]):
+        self._queue.put_nowait(json.dumps(record, default=str) + "\n")
+
+    async def _write(self):
+        done = False
+        while not done:
+            batch = [await self._queue.get()]
+            while len(batch) < WRITE_BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if None in batch:
+                done = True
+                batch = [line for line in batch if line is not None]
+            await asyncio.to_thread(self._flush, batch)
+
+    def _flush(self, lines: List[str]):
+        self._file.writelines(lines)
+        self._file.flush()
+
+    async def __aexit__(self, *exc):
+        self._queue.put_nowait(None)
+        await self._task
+        self._file.close()
+
+
+async def run_dataset(args) -> Dict[str, Any]:
+    # Imported here so argument errors do not pay for Playwright start-up
+    from playwright.async_api import async_playwright
+    from message_processor import ACTION_HANDLERS
+    from playwright_manager import ContextPool
+    from routing_profiles import resolve_profile, routing_for
+    from script_compiler import compile_script
+    from script_runner import run_steps
+
+    plan = compile_script(args.script, ACTION_HANDLERS)
+    profile = resolve_profile(plan.routing) if plan.routing is not None else None
+    rows: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=args.workers * QUEUE_FACTOR)
+    counts = {"rows": 0, "passed": 0, "failed": 0}
+    started = time.monotonic()
+
+    async def produce():
+        # File reads and parsing run off the event loop, a chunk at a time; put() waits while the workers are busy
+        reader = iter_rows(args.dataset, args.offset, args.limit)
+        source = enumerate(reader, start=args.offset)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(list, itertools.islice(source, READ_CHUNK))
+                if not chunk:
+                    break
+                for item in chunk:
+                    await rows.put(item)
+        finally:
+            # Closes the file when the run is cancelled before the dataset is exhausted
+            reader.close()
+        for _ in range(args.workers):
+            await rows.put(None)
+
+    async def work(pool: ContextPool, writer: ResultWriter):
+        while True:
+            item = await rows.get()
+            if item is None:
+                return
+            number, row = item
+            record: Dict[str, Any] = {"row": number}
+            variables = dict(row)
+            session = await pool.acquire()
+            try:
+                if profile:
+                    await routing_for(session.page).set_profile(profile)
+                summary = await run_steps(
+                    session.page, plan, ACTION_HANDLERS, variables=variables,
+                    stop_on_error=not args.continue_on_error, include_stack=False, record_flakes=False,
+                )
+                record.update(ok=summary["failed"] == 0, totalMs=summary["totalMs"], failed=summary["failed"])
+                if args.keep_vars:
+                    record["vars"] = {k: v for k, v in variables.items() if k not in row or row[k] != v}
+            except Exception as e:
+                record.update(ok=False, error=f"{e.__class__.__name__}: {e}")
+            finally:
+                await pool.release(session)
+            counts["rows"] += 1
+            counts["passed" if record["ok"] else "failed"] += 1
+            writer.add(record)
+            if counts["rows"] % args.progress_every == 0:
+                rate = counts["rows"] / (time.monotonic() - started)
+                print(f"  {counts['rows']} rows, {counts['failed']} failed ({rate:.1f} rows/s)")
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not args.headed)
+        pool = ContextPool(browser, args.workers, args.workers)
+        try:
+            await pool.start()
+            async with ResultWriter(args.out) as writer:
+                producer = asyncio.create_task(produce())
+                workers = [asyncio.create_task(work(pool, writer)) for _ in range(args.workers)]
+                try:
+                    await asyncio.gather(producer, *workers)
+                finally:
+                    for task in [producer, *workers]:
+                        task.cancel()
+        finally:
+            await pool.close()
+            await browser.close()
+
+    elapsed = time.monotonic() - started
+    return {**counts, "seconds": round(elapsed, 1), "rowsPerSec": round(counts["rows"] / elapsed, 1) if elapsed else None}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a saved script once per row of a CSV or JSONL dataset.")
+    parser.add_argument("script", help="Saved script name; ${column} placeholders take the row's values")
+    parser.add_argument("dataset", type=Path, help="CSV with a header line, or JSONL with one object per line")
+    parser.add_argument("-o", "--out", type=Path, help="JSONL file results are appended to (default: <dataset>.results.jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Rows run concurrently, one browser context each")
+    parser.add_argument("--offset", type=int, default=0, help="Skip this many rows (resume an interrupted run)")
+    parser.add_argument("--limit", type=int, help="Run at most this many rows")
+    parser.add_argument("--continue-on-error", action="store_true", help="Run the remaining steps of a row after a failed step")
+    parser.add_argument("--keep-vars", action="store_true", help="Store variables set by storeAs steps in each result line")
+    parser.add_argument("--progress-every", type=int, default=100, help="Print progress every N rows")
+    parser.add_argument("--headed", action="store_true", help="Show the browser window")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if not args.dataset.exists():
+        parser.error(f"Dataset not found: {args.dataset}")
+    args.out = args.out or args.dataset.with_suffix(".results.jsonl")
+    args.progress_every = max(1, args.progress_every)
+
+    print(f"Running {args.script} over {args.dataset} with {args.workers} worker(s)...")
+    report = asyncio.run(run_dataset(args))
+    print(f"\n{report['passed']} passed, {report['failed']} failed in {report['seconds']} s ({report['rowsPerSec']} rows/s)")
+    print(f"Results: {args.out}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from api.scripts import SCRIPTS_DIR
+from routing_profiles import PROFILES
+from run_suite import HISTORY_FILE, discover_scripts, load_history
+from utils.sharding import balance_shards
+
+# Helpers shared by all exported modules (written next to them as playtest_runtime.py)
+RUNTIME = '''"""Runtime for test modules exported from playtest scripts (pytest + pytest-playwright)."""
+import fnmatch
+import re
+import time
+from urllib.parse import urlparse
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+VAR_PATTERN = re.compile(r"\\$\\{([^}]+)\\}")
+# Upper bound on executed steps per run, so a nextOnOk/nextOnError cycle cannot hang CI
+MAX_STEPS = 10000
+
+
+class Step(NamedTuple):
+    index: int
+    fn: Callable[[Any, Dict[str, Any]], Any]
+    name: Optional[str] = None
+    store_as: Optional[str] = None
+    retries: int = 0
+    retry_delay_ms: int = 0
+    next_on_ok: Optional[Union[str, int]] = None
+    next_on_error: Optional[Union[str, int]] = None
+
+
+def interpolate(value: Any, variables: Dict[str, Any]) -> Any:
+    if isinstance(value, str):
+        return VAR_PATTERN.sub(lambda m: "" if variables.get(m.group(1).strip()) is None else str(variables[m.group(1).strip()]), value)
+    if isinstance(value, list):
+        return [interpolate(v, variables) for v in value]
+    if isinstance(value, dict):
+        return {k: interpolate(v, variables) for k, v in value.items()}
+    return value
+
+
+def _jump(steps: List[Step], target: Union[str, int]) -> int:
+    if target == "end":
+        return len(steps)
+    for pos, step in enumerate(steps):
+        if step.name == target or step.index == target or str(step.index) == str(target):
+            return pos
+    raise LookupError(f"jump target not found: {target!r}")
+
+
+def run(page, steps: List[Step], variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run steps in order, honouring retries, storeAs and nextOnOk/nextOnError jumps."""
+    variables = {} if variables is None else variables
+    pos = executed = 0
+    while pos < len(steps):
+        executed += 1
+        if executed > MAX_STEPS:
+            raise RuntimeError(f"more than {MAX_STEPS} steps executed; check nextOnOk/nextOnError for a cycle")
+        step = steps[pos]
+        for attempt in range(step.retries + 1):
+            try:
+                value = step.fn(page, variables)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < step.retries and step.retry_delay_ms:
+                    time.sleep(step.retry_delay_ms / 1000)
+        if error is None:
+            if step.store_as:
+                variables[step.store_as] = value
+            target = step.next_on_ok
+        elif step.next_on_error is not None:
+            target = step.next_on_error
+        else:
+            raise error
+        pos = pos + 1 if target is None else _jump(steps, target)
+    return variables
+
+
+def click_position(page, x: float, y: float):
+    # Same approach as the backend: scroll the page position into view, then click viewport coordinates
+    page.evaluate("(c) => window.scrollTo({left: Math.max(0, c.x - innerWidth / 2), top: Math.max(0, c.y - innerHeight / 2), behavior: 'instant'})", {"x": x, "y": y})
+    page.wait_for_timeout(300)
+    scroll = page.evaluate("() => ({x: window.scrollX, y: window.scrollY})")
+    page.mouse.click(x - scroll["x"], y - scroll["y"])
+
+
+def set_routing(page, spec: Optional[Dict[str, Any]]):
+    """Block resource types/URL globs, stub hosts with 204 and add latency (see routing_profiles.py)."""
+    page.unroute("**/*")
+    if not spec:
+        return
+    types = set(spec.get("blockTypes") or [])
+    urls = [re.compile(p[3:]) if p.startswith("re:") else re.compile(fnmatch.translate(p)) for p in spec.get("blockUrls") or []]
+    hosts = [h.lower().lstrip(".") for h in spec.get("stubHosts") or []]
+    latency = int(spec.get("latencyMs") or 0)
+
+    def handle(route):
+        request = route.request
+        host = (urlparse(request.url).hostname or "").lower()
+        if any(host == h or host.endswith("." + h) for h in hosts):
+            return route.fulfill(status=204, body="")
+        if request.resource_type in types or any(p.match(request.url) for p in urls):
+            return route.abort("blockedbyclient")
+        if latency:
+            time.sleep(latency / 1000)
+        route.fallback()
+
+    page.route("**/*", handle)
+
+
+def find_frame(page, name: Optional[str], url: Optional[str]):
+    frame = page.frame(name=name) if name else None
+    if frame is None and url:
+        frame = page.frame(url=re.compile(url))
+    if frame is None:
+        raise LookupError("switchFrame: frame not found")
+    return frame
+'''
+
+
+def _has_slots(value: Any) -> bool:
+    return "${" in json.dumps(value, default=str)
+
+
+def _lit(value: Any) -> str:
+    """Python expression for a step field; values with ${var} are interpolated at run time."""
+    return f"interpolate({value!r}, v)" if _has_slots(value) else repr(value)
+
+
+def _timeout(opts: Dict[str, Any], default_ms: int) -> int:
+    try:
+        return int(opts.get("timeout", opts.get("ms", default_ms)))
+    except (TypeError, ValueError):
+        return default_ms
+
+
+def _step_body(step: Dict[str, Any], ctx: str, subs: List[str]) -> List[str]:
+    """Statements implementing one step (the value of the last `return` feeds storeAs)."""
+    action = step.get("action")
+    opts = step.get("options") if isinstance(step.get("options"), dict) else {}
+    target = step.get("target") or {}
+    sel = _lit(target.get("selector") if isinstance(target, dict) else target)
+    value = step.get("value")
+    val = _lit(value)
+    t = _timeout(opts, 10000)
+    nav_t = _timeout(opts, 30000)
+
+    if action == "goto":
+        return [f"page.goto({_lit(value or opts.get('url'))}, timeout={nav_t}, wait_until={opts.get('waitUntil', 'load')!r})", "return page.url"]
+    if action == "reload":
+        return [f"page.reload(timeout={nav_t}, wait_until={opts.get('waitUntil', 'load')!r})", "return page.url"]
+    if action == "goBack":
+        return [f"page.go_back(timeout={nav_t})", "return page.url"]
+    if action == "goForward":
+        return [f"page.go_forward(timeout={nav_t})", "return page.url"]
+    if action in ("waitForSelector", "waitForVisible", "waitForHidden"):
+        state = {"waitForVisible": "visible", "waitForHidden": "hidden"}.get(action, opts.get("state", "attached"))
+        return [f"page.wait_for_selector({sel}, timeout={t}, state={state!r})"]
+    if action == "waitForNavigation":
+        return [
+            f"with page.expect_navigation(url={_lit(opts.get('url'))}, wait_until={opts.get('waitUntil')!r}, timeout={nav_t}):",
+            "    pass",
+            "return page.url",
+        ]
+    if action == "waitForNetworkIdle":
+        return [f"page.wait_for_load_state('networkidle', timeout={nav_t})"]
+    if action == "waitTimeout":
+        return [f"page.wait_for_timeout(int({_lit(opts.get('ms') or value)}))"]
+    if action in ("click", "dblclick", "hover"):
+        return [f"page.{action}({sel}, timeout={t})"]
+    if action == "clickPosition":
+        return [
+            f"pos = {val}",
+            "pos = json.loads(pos) if isinstance(pos, str) else pos",
+            "click_position(page, float(pos['x']), float(pos['y']))",
+        ]
+    if action in ("fill", "type"):
+        return [f"page.{action}({sel}, str({val}), timeout={t})"]
+    if action == "press":
+        return [f"page.press({sel}, {_lit(value or opts.get('key'))}, timeout={t})"]
+    if action == "selectOption":
+        return [f"return page.select_option({sel}, {_lit(value or opts.get('value'))}, timeout={t})"]
+    if action == "expectExists":
+        return [f"expect(page.locator({sel}).first).to_be_attached(timeout={t})"]
+    if action == "expectNotExists":
+        return [f"expect(page.locator({sel})).to_have_count(0, timeout={t})"]
+    if action == "expectVisible":
+        return [f"expect(page.locator({sel}).first).to_be_visible(timeout={t})"]
+    if action == "expectTextContains":
+        return [f"expect(page.locator({sel}).first).to_contain_text(str({val}), timeout={t}, use_inner_text=True)"]
+    if action == "expectUrlMatches":
+        flags = "re.IGNORECASE" if opts.get("ignoreCase") else "0"
+        return [f"expect(page).to_have_url(re.compile({_lit(value or opts.get('pattern'))}, {flags}), timeout={t})", "return page.url"]
+    if action == "expectTitle":
+        mode = opts.get("mode", "equals")
+        matcher = {"contains": f"re.compile(re.escape({val}))", "regex": f"re.compile({val})"}.get(mode, val)
+        return [f"expect(page).to_have_title({matcher}, timeout={t})"]
+    if action == "getText":
+        return [f"return page.locator({sel}).inner_text(timeout={t})"]
+    if action == "getAttribute":
+        return [f"return page.locator({sel}).get_attribute({_lit(value or opts.get('name'))}, timeout={t})"]
+    if action == "getValue":
+        return [f"return page.locator({sel}).input_value(timeout={t})"]
+    if action == "getContent":
+        return ["return {'content_length': len(page.content())}"]
+    if action == "getUrl":
+        return ["return page.url"]
+    if action == "screenshot":
+        return [
+            "SCREENSHOTS_DIR.mkdir(exist_ok=True)",
+            f"page.screenshot(path=str(SCREENSHOTS_DIR / (__name__ + '-{ctx}.png')), full_page={bool(opts.get('fullPage'))})",
+        ]
+    if action == "setViewport":
+        return [f"page.set_viewport_size({{'width': int({_lit(opts.get('width'))}), 'height': int({_lit(opts.get('height'))})}})"]
+    if action == "setDefaultTimeout":
+        return [f"page.set_default_timeout(int({_lit(opts.get('timeout') or value)}))"]
+    if action == "switchFrame":
+        return [f"return find_frame(page, {_lit(opts.get('name'))}, {_lit(opts.get('url'))}).url"]
+    if action == "setRouting":
+        return [f"set_routing(page, {_routing_spec(value or opts.get('profile'))!r})"]
+    if action == "evalJs":
+        return [f"return page.evaluate({val})"]
+    if action in ("startScreencast", "stopScreencast"):
+        return ["pass  # live view only; nothing to do in CI"]
+    if action == "runScript":
+        if isinstance(opts.get("steps"), list):
+            sub = f"SUB_{ctx}"
+            subs.append(_emit_steps(opts["steps"], sub))
+            return [f"return run(page, {sub}, dict({_lit(opts.get('vars') or {})}))"]
+        module = "test_" + _module_name(str(value or opts.get("name") or ""))
+        return [f"return run(page, importlib.import_module({module!r}).STEPS, dict({_lit(opts.get('vars') or {})}))"]
+    if action == "startTrace":
+        return ["page.context.tracing.start(screenshots=True, snapshots=True)"]
+    if action == "stopTrace":
+        return [f"page.context.tracing.stop(path=str(TRACES_DIR / (__name__ + '-{ctx}.zip')))"]
+    return [f"pytest.fail({('Unsupported action: ' + str(action))!r})"]
+
+
+def _emit_steps(steps: List[Any], list_name: str) -> str:
+    functions: List[str] = []
+    subs: List[str] = []
+    entries: List[str] = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict):
+            continue
+        if step.get("enabled") is False:
+            entries.append(f"    # step {index} skipped (disabled): {step.get('action')}")
+            continue
+        ctx = f"{list_name.lower()}_{index}"
+        fn = f"_{ctx}"
+        body = _step_body(step, ctx, subs)
+        functions.append(f"def {fn}(page, v):\n    # {step.get('action')}" + (f" - {step['name']}" if step.get("name") else "") + "\n" + "\n".join("    " + line for line in body))
+        fields = [f"{index}", fn]
+        for key, arg in (("name", "name"), ("storeAs", "store_as"), ("nextOnOk", "next_on_ok"), ("nextOnError", "next_on_error")):
+            if step.get(key) not in (None, ""):
+                fields.append(f"{arg}={step[key]!r}")
+        for key, arg in (("retries", "retries"), ("retryDelayMs", "retry_delay_ms")):
+            try:
+                if int(step.get(key) or 0):
+                    fields.append(f"{arg}={int(step[key])}")
+            except (TypeError, ValueError):
+                pass
+        entries.append(f"    Step({', '.join(fields)}),")
+    parts = subs + functions + [f"{list_name} = [\n" + "\n".join(entries) + "\n]"]
+    return "\n\n\n".join(parts)
+
+
+def _routing_spec(profile: Any) -> Optional[Dict[str, Any]]:
+    # Profiles are resolved at export time so the modules do not depend on the server's config
+    if isinstance(profile, dict) or profile is None:
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown routing profile '{profile}'")
+    return PROFILES[profile] or None
+
+
+def _module_name(name: str) -> str:
+    return re.sub(r"\W", "_", name)
+
+
+def generate_pytest_module(name: str, steps: List[Any], shard: Optional[str] = None, routing: Any = None) -> str:
+    """Source of a pytest module (pytest-playwright `page` fixture) equivalent to the script."""
+    header = [
+        f'"""Exported from playtest script \'{name}\'. Regenerate instead of editing."""',
+        "import importlib",
+        "import json",
+        "import re",
+        "from pathlib import Path",
+        "",
+        "import pytest",
+        "from playwright.sync_api import expect",
+        "",
+        "from playtest_runtime import Step, click_position, find_frame, interpolate, run, set_routing",
+        "",
+        "SCREENSHOTS_DIR = Path(__file__).parent / 'screenshots'",
+        "TRACES_DIR = Path(__file__).parent",
+    ]
+    if shard:
+        # `pytest -n <shards> --dist loadgroup` keeps each balanced bucket on one worker
+        header += ["", f"pytestmark = pytest.mark.xdist_group({shard!r})"]
+    setup = f"    set_routing(page, {_routing_spec(routing)!r})\n" if routing is not None else ""
+    test = f"def test_{_module_name(name)}(page):\n{setup}    run(page, STEPS)\n"
+    return "\n".join(header) + "\n\n\n" + _emit_steps(steps, "STEPS") + "\n\n\n" + test
+
+
+def build_shard_manifest(names: List[str], durations: Dict[str, float], shard_count: int) -> Dict[str, Any]:
+    """Balanced buckets of exported modules, with the estimated duration of each bucket."""
+    known = sorted(durations[n] for n in names if n in durations)
+    default_ms = known[len(known) // 2] if known else 1000.0
+    shards = [shard for shard in balance_shards(names, durations, shard_count, default_ms) if shard]
+    return {
+        "shards": [
+            {
+                "files": [f"test_{_module_name(n)}.py" for n in shard],
+                "estimatedMs": int(sum(durations.get(n, default_ms) for n in shard)),
+            }
+            for shard in shards
+        ],
+        "unknownDurations": sorted(n for n in names if n not in durations),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export saved scripts as pytest modules (Playwright Python).")
+    parser.add_argument("out", type=Path, help="Output directory")
+    parser.add_argument("-k", "--filter", help="Only export scripts whose name contains this substring")
+    parser.add_argument("-n", "--shards", type=int, default=1, help="Number of balanced shards in shards.json")
+    parser.add_argument("--history", type=Path, default=HISTORY_FILE, help="Recorded durations (from run_suite.py) used for balancing")
+    args = parser.parse_args(argv)
+
+    names = discover_scripts(args.filter)
+    args.out.mkdir(parents=True, exist_ok=True)
+    manifest = build_shard_manifest(names, load_history(args.history), max(1, args.shards))
+    group = {f: f"shard-{i + 1}" for i, s in enumerate(manifest["shards"]) for f in s["files"]} if args.shards > 1 else {}
+
+    (args.out / "playtest_runtime.py").write_text(RUNTIME, "utf-8")
+    for name in names:
+        data = json.loads((SCRIPTS_DIR / f"{name}.json").read_text("utf-8"))
+        filename = f"test_{_module_name(name)}.py"
+        (args.out / filename).write_text(generate_pytest_module(name, data.get("steps") or [], group.get(filename), data.get("routing")), "utf-8")
+    (args.out / "shards.json").write_text(json.dumps(manifest, indent=2), "utf-8")
+
+    print(f"Exported {len(names)} script(s) to {args.out} in {len(manifest['shards'])} shard(s).")
+    for i, shard in enumerate(manifest["shards"], 1):
+        print(f"  shard {i}: {len(shard['files'])} file(s), ~{shard['estimatedMs'] / 1000:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
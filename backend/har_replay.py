@@ -0,0 +1,92 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+import os
+from utils.sanitize_name import _sanitize_name
+
+# One HAR archive per script: hars/<name>.har.zip
+HAR_DIR = Path(os.environ.get("PLAYTEST_HAR_DIR", str(Path(__file__).parent / "hars")))
+HAR_MODES = ("record", "replay")
+# Requests missing from the HAR: "abort" (fully offline) or "fallback" (go to the network)
+NOT_FOUND_POLICIES = ("abort", "fallback")
+DEFAULT_NOT_FOUND = os.environ.get("PLAYTEST_HAR_NOT_FOUND", "abort")
+
+
+def har_path(name: str) -> Path:
+    return HAR_DIR / f"{_sanitize_name(name)}.har.zip"
+
+
+def _check(mode: str, not_found: str):
+    if mode not in HAR_MODES:
+        raise ValueError(f"Unknown HAR mode '{mode}' (record | replay)")
+    if not_found not in NOT_FOUND_POLICIES:
+        raise ValueError(f"Unknown HAR notFound policy '{not_found}' (abort | fallback)")
+
+
+async def attach_har(context, path: Path, mode: str, not_found: str = DEFAULT_NOT_FOUND, url: Optional[str] = None):
+    """
+    Record into or replay from a HAR for a context created for this run.
+
+    A recorded HAR is written when the context is closed, so use this on
+    dedicated contexts (run_suite.py); `HarScope` covers the shared page.
+    """
+    _check(mode, not_found)
+    if mode == "record":
+        path.parent.mkdir(parents=True, exist_ok=True)
+        await context.route_from_har(path, url=url, update=True, update_content="attach", update_mode="minimal")
+    else:
+        if not path.exists():
+            raise FileNotFoundError(f"No HAR recorded at {path}")
+        await context.route_from_har(path, url=url, not_found=not_found)
+
+
+class HarScope:
+    """
+    Record or replay a HAR for the duration of a block, for a page on the long-lived context.
+
+    Replay runs on a dedicated page of the same context (`self.page`): its HAR
+    routes, and the archive they keep open, go away when it is closed on exit,
+    while routes on the shared page and context stay untouched. Recording
+    captures the shared page's context.
+    """
+
+    def __init__(self, page, name: str, mode: str, not_found: str = DEFAULT_NOT_FOUND, url: Optional[str] = None):
+        _check(mode, not_found)
+        self.page = page
+        self.context = page.context
+        self.path = har_path(name)
+        self.mode = mode
+        self.not_found = not_found
+        self.url = url
+
+    @property
+    def report(self) -> Dict[str, Any]:
+        report = {"mode": self.mode, "har": str(self.path)}
+        if self.mode == "replay":
+            report["notFound"] = self.not_found
+        return report
+
+    async def __aenter__(self):
+        if self.mode == "replay":
+            if not self.path.exists():
+                raise FileNotFoundError(f"No HAR recorded at {self.path}")
+            self.page = await self.context.new_page()
+            try:
+                await self.page.route_from_har(self.path, url=self.url, not_found=self.not_found)
+            except BaseException:
+                await self.page.close()
+                raise
+            return self
+        # route_from_har(update=True) only writes on context close; the shared context stays open
+        start_har = getattr(self.context.tracing, "start_har", None)
+        if start_har is None:
+            raise ValueError("HAR recording on the live page needs Playwright with tracing.start_har; use run_suite.py --har record")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        await start_har(str(self.path), mode="minimal", url_filter=self.url)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.mode == "replay":
+            # Closing the page disposes its HAR router
+            await self.page.close()
+        else:
+            await self.context.tracing.stop_har()
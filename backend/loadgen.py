@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark import BENCH_ENV, BenchClient, free_port
+from utils.latency import summarize
+
+# Commands a simulated extension client can send; all run against the bundled /test page
+COMMANDS: Dict[str, Dict[str, Any]] = {
+    "getUrl": {"action": "getUrl"},
+    "getText": {"action": "getText", "target": {"selector": "#textElement"}},
+    "getValue": {"action": "getValue", "target": {"selector": "#getValue"}},
+    "click": {"action": "click", "target": {"selector": "#simpleBtn"}},
+    "fill": {"action": "fill", "target": {"selector": "#textInput"}, "value": "load"},
+    "expectVisible": {"action": "expectVisible", "target": {"selector": "#visibleElement"}},
+    "expectTextContains": {"action": "expectTextContains", "target": {"selector": "#textElement"}, "value": "text content"},
+    "hover": {"action": "hover", "target": {"selector": "#hoverBox"}},
+}
+DEFAULT_MIX = "getText=4,getUrl=2,click=2,fill=1,expectTextContains=1"
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    """'getText=4,click=1' -> [(name, weight)]; a bare name has weight 1."""
+    mix = []
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"Unknown command '{name}' (available: {', '.join(COMMANDS)})")
+        try:
+            mix.append((name, float(weight or 1)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight in '{part}'")
+    if not mix:
+        raise argparse.ArgumentTypeError("The mix is empty")
+    return mix
+
+
+class LocalServer:
+    """The app served by uvicorn on its own thread and event loop, so client load does not skew server timings."""
+
+    def __init__(self):
+        for key, value in BENCH_ENV.items():
+            os.environ.setdefault(key, value)
+        # Imported after the environment is set: server modules read it at import time
+        import uvicorn
+        from main import app
+
+        self.port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="playtest-server", daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Server stopped during startup (see the log above)")
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_names: Dict[str, int] = {}
+
+    def add(self, name: str, latency_ms: float, result: Optional[Dict[str, Any]], error: Optional[str] = None):
+        self.latencies.setdefault(name, []).append(latency_ms)
+        if error is None and result is not None and result.get("status") != "ok":
+            error = (result.get("error") or {}).get("name") or "Error"
+        if error is not None:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            self.error_names[error] = self.error_names.get(error, 0) + 1
+
+
+async def _connect(base: str, path: str):
+    import websockets
+
+    ws = await websockets.connect(base.replace("http", "ws", 1) + "/ws", max_size=None)
+    client = BenchClient(ws)
+    await ws.send(json.dumps({"type": "hello", "encodings": ["json"], "ack": False, "stack": False}))
+    result = await client.send({"action": "goto", "value": base + path, "options": {"waitUntil": "load"}})
+    if result.get("status") != "ok":
+        await client.close()
+        raise RuntimeError(f"goto {path} failed: {(result.get('error') or {}).get('message')}")
+    return client
+
+
+async def _timed(client: BenchClient, name: str, recorder: Recorder, scheduled: float):
+    # Latency counts from the scheduled send time, so a backed-up server is not hidden (coordinated omission)
+    try:
+        result = await client.send(COMMANDS[name])
+        recorder.add(name, (time.perf_counter() - scheduled) * 1000, result)
+    except Exception as e:
+        recorder.add(name, (time.perf_counter() - scheduled) * 1000, None, e.__class__.__name__)
+
+
+async def closed_loop(clients: List[BenchClient], mix, duration: float, think_ms: float, recorder: Recorder):
+    """Every client sends its next command as soon as the previous one returned (plus think time)."""
+    names, weights = zip(*mix)
+    deadline = time.perf_counter() + duration
+
+    async def user(client: BenchClient):
+        while time.perf_counter() < deadline:
+            await _timed(client, random.choices(names, weights)[0], recorder, time.perf_counter())
+            if think_ms:
+                await asyncio.sleep(think_ms / 1000)
+
+    await asyncio.gather(*(user(c) for c in clients))
+
+
+async def open_loop(clients: List[BenchClient], mix, duration: float, rate: float, recorder: Recorder):
+    """Commands arrive at a fixed total rate regardless of how fast earlier ones finish."""
+    names, weights = zip(*mix)
+    interval = 1 / rate
+    started = time.perf_counter()
+    in_flight = set()
+    i = 0
+    while True:
+        scheduled = started + i * interval
+        if scheduled - started >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(_timed(clients[i % len(clients)], random.choices(names, weights)[0], recorder, scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        i += 1
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+def _event_loop_stats(base: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(base + "/status", timeout=5) as resp:
+            return json.loads(resp.read()).get("eventLoop")
+    except Exception:
+        return None
+
+
+async def run_load(base: str, args) -> Dict[str, Any]:
+    connected = await asyncio.gather(*(_connect(base, args.page) for _ in range(args.connections)), return_exceptions=True)
+    clients = [c for c in connected if isinstance(c, BenchClient)]
+    connect_errors = [f"{e.__class__.__name__}: {e}" for e in connected if not isinstance(e, BenchClient)]
+    if not clients:
+        raise RuntimeError(f"No connection could be opened: {connect_errors[0] if connect_errors else 'unknown error'}")
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    try:
+        if args.mode == "open":
+            await open_loop(clients, args.mix, args.duration, args.rate, recorder)
+        else:
+            await closed_loop(clients, args.mix, args.duration, args.think_ms, recorder)
+    finally:
+        wall = time.perf_counter() - started
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    all_ms = [ms for values in recorder.latencies.values() for ms in values]
+    total = len(all_ms)
+    errors = sum(recorder.errors.values())
+    return {
+        "mode": args.mode,
+        "connections": len(clients),
+        "connectErrors": connect_errors,
+        "durationS": round(wall, 2),
+        "commands": total,
+        "throughput": round(total / wall, 1) if wall else None,
+        "errorRate": round(errors / total, 4) if total else None,
+        "errors": recorder.error_names,
+        "latencyMs": summarize(all_ms),
+        "byAction": {
+            name: {**summarize(values), "errors": recorder.errors.get(name, 0)}
+            for name, values in sorted(recorder.latencies.items())
+        },
+        "eventLoop": await asyncio.to_thread(_event_loop_stats, base),
+    }
+
+
+def _print_report(report: Dict[str, Any]):
+    lat = report["latencyMs"]
+    print(f"\n{report['commands']} commands over {report['connections']} connection(s) in {report['durationS']} s ({report['mode']} loop)")
+    print(f"Throughput: {report['throughput']} commands/s, error rate {report['errorRate']}")
+    print(f"Latency: p50 {lat['p50']} ms, p95 {lat['p95']} ms, p99 {lat['p99']} ms, max {lat['max']} ms")
+    for name, stats in report["byAction"].items():
+        print(f"    {name:<20} n={stats['n']:<6} p50 {stats['p50']} ms  p95 {stats['p95']} ms  p99 {stats['p99']} ms  errors {stats['errors']}")
+    loop = report.get("eventLoop")
+    if loop:
+        print(f"Server event-loop lag: p50 {loop['lagMsP50']} ms, p99 {loop['lagMsP99']} ms, max {loop['lagMsRecentMax']} ms")
+    if report["connectErrors"]:
+        print(f"{len(report['connectErrors'])} connection(s) failed: {report['connectErrors'][0]}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate extension clients against /ws and report throughput and tail latency.")
+    parser.add_argument("--url", help="Base URL of a running server (default: start one in-process)")
+    parser.add_argument("-c", "--connections", type=int, default=10, help="Simulated clients")
+    parser.add_argument("-d", "--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: each client waits for its reply; open: fixed arrival rate")
+    parser.add_argument("--rate", type=float, default=100, help="Open loop: commands per second across all clients")
+    parser.add_argument("--think-ms", type=float, default=0, help="Closed loop: pause after each reply")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Weighted commands (default {DEFAULT_MIX})")
+    parser.add_argument("--page", default="/test", help="Page every client opens first")
+    parser.add_argument("--json", dest="json_out", type=Path, help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    if args.url:
+        report = asyncio.run(run_load(args.url.rstrip("/"), args))
+    else:
+        with LocalServer() as base:
+            report = asyncio.run(run_load(base, args))
+    _print_report(report)
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2), "utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
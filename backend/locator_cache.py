@@ -0,0 +1,211 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+import re
+import time
+from metrics import LOCATOR_CACHE_LOOKUPS
+
+logger = logging.getLogger("uvicorn.error")
+
+# Reuse element handles resolved by earlier steps until the page navigates (opt-in: "1" enables).
+# Compare `benchmark.py --locator-cache` against a baseline without it before turning it on.
+ENABLED = os.environ.get("PLAYTEST_LOCATOR_CACHE", "0") == "1"
+# Also drop a frame's handles when its DOM loses nodes or changes id/class/name attributes
+MUTATION_INVALIDATION = os.environ.get("PLAYTEST_LOCATOR_CACHE_MUTATIONS", "0") == "1"
+# Handles kept per page; the oldest is dropped first
+MAX_ENTRIES = 256
+
+_BINDING = "__ptLocatorCacheInvalidate"
+# Coalesces all mutations of one task into a single binding call
+_OBSERVER_SCRIPT = """
+(() => {
+  if (window.__ptLocatorObserver || !window.%(binding)s) return;
+  let pending = false;
+  const observer = new MutationObserver((records) => {
+    if (pending || !records.some(r => r.type === 'attributes' || r.removedNodes.length)) return;
+    pending = true;
+    queueMicrotask(() => { pending = false; window.%(binding)s(); });
+  });
+  observer.observe(document, {
+    childList: true, subtree: true, attributes: true,
+    attributeFilter: ['id', 'class', 'name', 'data-testid'],
+  });
+  window.__ptLocatorObserver = observer;
+})()
+""" % {"binding": _BINDING}
+
+# Playwright error texts meaning a cached handle no longer points into the live DOM
+_STALE_MARKERS = ("not attached", "detached", "execution context was destroyed", "target closed", "has been disposed")
+
+# Playwright-only selector syntax (engine prefixes such as text= or xpath=, XPath, chains,
+# text/layout pseudo-classes): such selectors are left to Playwright and never cached
+_ENGINE_PREFIX = re.compile(r"^\s*[a-zA-Z_-]+=")
+_PLAYWRIGHT_ONLY = (
+    ">>", "internal:", ":has-text(", ":text(", ":text-is(", ":text-matches(", ":visible",
+    ":nth-match(", ":right-of(", ":left-of(", ":above(", ":below(", ":near(",
+)
+
+Key = Tuple[Any, str]
+
+
+def is_cacheable(selector: str) -> bool:
+    """True for plain CSS selectors; decided before the first resolution."""
+    stripped = selector.strip()
+    if not stripped or _ENGINE_PREFIX.match(stripped) or stripped[0] in "/(\"'" or stripped.startswith(".."):
+        return False
+    return not any(token in stripped for token in _PLAYWRIGHT_ONLY)
+
+
+def _is_stale(error: Exception) -> bool:
+    text = str(error).lower()
+    return any(marker in text for marker in _STALE_MARKERS)
+
+
+class LocatorCache:
+    """
+    Element handles of one page keyed by (frame, selector).
+
+    An entry lives until its frame navigates or is detached (or, with
+    MUTATION_INVALIDATION, until the frame's DOM changes). A handle that turns
+    out stale anyway is dropped and the step falls back to the selector. A
+    handle that is still attached is reused as is, so a state-dependent
+    selector (.active, :checked, :nth-child) keeps its first match until one
+    of those events: hence opt-in.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self._handles: Dict[Key, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+        self._observing = False
+        page.on("framenavigated", self.invalidate_frame)
+        page.on("framedetached", self.invalidate_frame)
+
+    def invalidate_frame(self, frame):
+        keys = [k for k in self._handles if k[0] is frame]
+        if not keys:
+            return
+        self.invalidations += 1
+        for key in keys:
+            self._drop(key)
+
+    def evict(self, frame, selector: str):
+        self._drop((frame, selector))
+
+    def _drop(self, key: Key):
+        handle = self._handles.pop(key, None)
+        if handle is not None:
+            # Release the remote object; it may already be gone with its document
+            asyncio.ensure_future(handle.dispose()).add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    async def observe_mutations(self):
+        if self._observing:
+            return
+        self._observing = True
+
+        def on_mutation(source, *_):
+            self.invalidate_frame(source.get("frame") if isinstance(source, dict) else None)
+
+        await self.page.expose_binding(_BINDING, on_mutation)
+        await self.page.add_init_script(_OBSERVER_SCRIPT)
+        for frame in self.page.frames:
+            try:
+                await frame.evaluate(_OBSERVER_SCRIPT)
+            except Exception as e:
+                logger.debug(f"Locator cache: no mutation observer in frame {frame.url}: {e}")
+
+    def cached(self, frame, selector: str):
+        return self._handles.get((frame, selector))
+
+    async def resolve(self, frame, selector: str, timeout: int):
+        handle = await frame.wait_for_selector(selector, state="attached", timeout=timeout)
+        if handle is None:
+            raise ValueError(f"No element matches {selector}")
+        if len(self._handles) >= MAX_ENTRIES:
+            self._drop(next(iter(self._handles)))
+        self._handles[(frame, selector)] = handle
+        return handle
+
+    def count(self, result: str):
+        setattr(self, result, getattr(self, result) + 1)
+        LOCATOR_CACHE_LOOKUPS.inc(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "invalidations": self.invalidations,
+            "entries": len(self._handles),
+        }
+
+
+_pages: Dict[Any, LocatorCache] = {}
+
+
+def cache_for(page) -> Optional[LocatorCache]:
+    """The page's cache, created on first use; None when caching is disabled or `page` is a frame."""
+    if not ENABLED or not hasattr(page, "main_frame"):
+        return None
+    cache = _pages.get(page)
+    if cache is None:
+        cache = _pages[page] = LocatorCache(page)
+        page.once("close", lambda _: _pages.pop(page, None))
+    return cache
+
+
+def stats_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    delta = {k: after[k] - before[k] for k in ("hits", "misses", "stale", "invalidations")}
+    lookups = delta["hits"] + delta["misses"]
+    delta["hitRate"] = round(delta["hits"] / lookups, 3) if lookups else None
+    return delta
+
+
+async def with_element(
+    page,
+    selector: str,
+    timeout: int,
+    on_handle: Callable[[Any, int], Awaitable[Any]],
+    on_selector: Callable[[], Awaitable[Any]],
+):
+    """
+    Run `on_handle(handle, remaining_timeout)` on the cached element for
+    `selector`, resolving and caching it on a miss. Without a cache, for
+    Playwright-only selectors, or when the cached handle is stale,
+    `on_selector()` runs the plain selector-based call.
+    """
+    cache = cache_for(page)
+    if cache is None or not is_cacheable(selector):
+        return await on_selector()
+    if MUTATION_INVALIDATION:
+        await cache.observe_mutations()
+    frame = page.main_frame
+    handle = cache.cached(frame, selector)
+    if handle is not None:
+        # One round-trip, like the selector call it replaces; a stale handle shows up as an error
+        try:
+            result = await on_handle(handle, timeout)
+            cache.count("hits")
+            return result
+        except Exception as e:
+            if not _is_stale(e):
+                raise
+            cache.count("stale")
+            cache.evict(frame, selector)
+            return await on_selector()
+    cache.count("misses")
+    started = time.monotonic()
+    handle = await cache.resolve(frame, selector, timeout)
+    remaining = max(1, timeout - int((time.monotonic() - started) * 1000))
+    try:
+        return await on_handle(handle, remaining)
+    except Exception as e:
+        if not _is_stale(e):
+            raise
+        # Replaced between resolution and action (re-render): let Playwright re-resolve
+        cache.evict(frame, selector)
+        return await on_selector()
@@ -0,0 +1,42 @@
+from collections import deque
+from typing import Any, Dict
+import asyncio
+import time
+from metrics import EVENT_LOOP_LAG
+from utils.latency import percentile
+
+# How often the loop is probed, and how many recent samples the snapshot covers (~100 s)
+SAMPLE_INTERVAL = 0.05
+WINDOW = 2048
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up: time the event loop was busy with other work."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, window: int = WINDOW):
+        self.interval = interval
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self.max_ms = 0.0
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            EVENT_LOOP_LAG.observe(lag)
+            lag_ms = lag * 1000
+            self._samples.append(lag_ms)
+            self.max_ms = max(self.max_ms, lag_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self._samples)
+        return {
+            "samples": len(recent),
+            "lagMsP50": round(percentile(recent, 50), 2) if recent else None,
+            "lagMsP99": round(percentile(recent, 99), 2) if recent else None,
+            "lagMsRecentMax": round(recent[-1], 2) if recent else None,
+            "lagMsMax": round(self.max_ms, 2),
+        }
+
+
+LOOP_MONITOR = LoopLagMonitor()
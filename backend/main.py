@@ -1,16 +1,35 @@
+import time
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket
 from connection_manager import ConnectionManager
-from playwright_manager import playwright_lifespan
-from api import test, scripts, websocket
+from playwright_manager import playwright_lifespan, record_startup_phase
+from api import test, scripts, history, status, metrics, websocket
+
+record_startup_phase("import", _import_started)
 
 # Initialize connection manager
 manager = ConnectionManager()
 
-app = FastAPI(lifespan=playwright_lifespan)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Last runs from the history database, then the browser
+    await history.seed_last_runs()
+    async with playwright_lifespan(app):
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Include routers
 app.include_router(test.router)
 app.include_router(scripts.router)
+app.include_router(history.router)
+app.include_router(status.router)
+app.include_router(metrics.router)
 
 
 @app.websocket("/ws")
@@ -1,14 +1,31 @@
 from fastapi import WebSocket
+from playwright.async_api import expect
 from connection_manager import ConnectionManager
-from playwright_manager import get_current_page, get_browser_context
+from protocol import Protocol
+from playwright_manager import BrowserSession, resolve_page
+from script_runner import run_steps
+from har_replay import DEFAULT_NOT_FOUND, HarScope
+from routing_profiles import ProfileScope, active_routing, resolve_profile, routing_for, stats_delta
+from api.scripts import STORE as SCRIPT_STORE
+from script_compiler import CompileError, compile_inline, compile_regex, compile_script
+from utils.sanitize_name import _sanitize_name
+import screencast
+from metrics import ACTION_DURATION, ACTION_ERRORS, SEND_DURATION
+from step_timing import run_timed, start_trace, stop_trace
+from step_retry import run_with_retries
+from run_history import HISTORY as RUN_HISTORY
+from locator_cache import cache_for, stats_delta as cache_stats_delta, with_element
+from utils.frames import encode_binary_frame
 import json
 import logging
 import asyncio
 import time
 import base64
+import hashlib
 import traceback
 import re
-from typing import Any, Dict, Callable, Awaitable, Optional
+from contextlib import AsyncExitStack
+from typing import Any, Dict, Callable, Awaitable, Optional, Union
 
 # Use Uvicorn's logger for colorized output
 logger = logging.getLogger("uvicorn.error")
@@ -24,6 +41,51 @@ async def _screenshot_base64(page, full_page: bool = False) -> Optional[str]:
         return None
 
 
+SCREENSHOT_FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+# Above this size hashing/encoding is moved off the event loop
+OFFLOAD_BYTES = 512 * 1024
+
+
+async def _capture_screenshot(page, opts: Dict[str, Any]) -> bytes:
+    fmt = opts.get("format", "png")
+    if fmt not in SCREENSHOT_FORMATS:
+        raise ValueError(f"screenshot: unsupported format '{fmt}' (png | jpeg | webp)")
+    full_page = bool(opts.get("fullPage"))
+    clip = opts.get("clip")
+    quality = opts.get("quality")
+
+    if fmt != "webp":
+        kwargs: Dict[str, Any] = {"full_page": full_page, "type": fmt}
+        if quality is not None and fmt == "jpeg":
+            kwargs["quality"] = int(quality)
+        if clip:
+            kwargs["clip"] = {k: float(clip[k]) for k in ("x", "y", "width", "height")}
+        if opts.get("scale") in ("css", "device"):
+            kwargs["scale"] = opts["scale"]
+        return await page.screenshot(**kwargs)
+
+    # Playwright only encodes PNG/JPEG; WebP goes through the Chromium DevTools protocol
+    params: Dict[str, Any] = {"format": "webp", "captureBeyondViewport": full_page}
+    if quality is not None:
+        params["quality"] = int(quality)
+    if not clip and full_page:
+        size = await page.evaluate(
+            "() => ({ width: document.documentElement.scrollWidth, height: document.documentElement.scrollHeight })"
+        )
+        clip = {"x": 0, "y": 0, **size}
+    if clip:
+        params["clip"] = {
+            **{k: float(clip[k]) for k in ("x", "y", "width", "height")},
+            "scale": float(opts.get("clipScale", 1)),
+        }
+    cdp = await page.context.new_cdp_session(page)
+    try:
+        result = await cdp.send("Page.captureScreenshot", params)
+    finally:
+        await cdp.detach()
+    return base64.b64decode(result["data"])
+
+
 def _build_ok(message_id: Any, details: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "type": "result",
@@ -33,20 +95,30 @@ def _build_ok(message_id: Any, details: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _build_error(message_id: Any, action: str, err: Exception, elapsed_ms: int) -> Dict[str, Any]:
+def _build_error(message_id: Any, action: str, err: Exception, elapsed_ms: int, stack: bool = False) -> Dict[str, Any]:
+    error = {"name": err.__class__.__name__, "message": f"{action}: {str(err)}"}
+    if stack:
+        # Only on request: formatting and sending tracebacks dominates cheap failed commands
+        error["stack"] = traceback.format_exc()
     return {
         "type": "result",
         "id": message_id,
         "status": "error",
-        "error": {
-            "name": err.__class__.__name__,
-            "message": f"{action}: {str(err)}",
-            "stack": traceback.format_exc(),
-        },
+        "error": error,
         "details": {"elapsedMs": elapsed_ms},
     }
 
 
+def _build_cancelled(message_id: Any) -> Dict[str, Any]:
+    return {
+        "type": "result",
+        "id": message_id,
+        "status": "error",
+        "error": {"name": "Cancelled", "message": "Command was cancelled"},
+        "details": {"elapsedMs": 0},
+    }
+
+
 def _get_timeout(options: Dict[str, Any], default_ms: int = 10000) -> int:
     if not options:
         return default_ms
@@ -59,10 +131,21 @@ async def _act_goto(page, message: Dict[str, Any]) -> Dict[str, Any]:
     url = message.get("value") or (message.get("options") or {}).get("url")
     if not url:
         raise ValueError("goto: 'value' or options.url is required")
-    timeout = _get_timeout(message.get("options"), 30000)
-    wait_until = (message.get("options") or {}).get("waitUntil", "load")
+    opts = message.get("options") or {}
+    timeout = _get_timeout(opts, 30000)
+    wait_until = opts.get("waitUntil", "load")
+    if opts.get("routing") is not None:
+        # Profile applies to this navigation only
+        async with ProfileScope(page, opts["routing"]) as scope:
+            resp = await page.goto(url, timeout=timeout, wait_until=wait_until)
+        return {"url": page.url, "status": getattr(resp, "status", None), "routing": scope.report}
+    state = active_routing(page)
+    before = state.stats() if state else None
     resp = await page.goto(url, timeout=timeout, wait_until=wait_until)
-    return {"url": page.url, "status": getattr(resp, "status", None)}
+    details = {"url": page.url, "status": getattr(resp, "status", None)}
+    if state:
+        details["routing"] = stats_delta(before, state.stats())
+    return details
 
 
 async def _act_reload(page, message: Dict[str, Any]) -> Dict[str, Any]:
@@ -136,7 +219,11 @@ async def _act_click(page, message: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("click: 'target.selector' is required")
     opts = message.get("options") or {}
     timeout = _get_timeout(opts)
-    await page.click(selector, timeout=timeout)
+    await with_element(
+        page, selector, timeout,
+        lambda el, t: el.click(timeout=t),
+        lambda: page.click(selector, timeout=timeout),
+    )
     return {"clicked": selector}
 
 
@@ -213,7 +300,11 @@ async def _act_dblclick(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not selector:
         raise ValueError("dblclick: 'target.selector' is required")
     timeout = _get_timeout(message.get("options"))
-    await page.dblclick(selector, timeout=timeout)
+    await with_element(
+        page, selector, timeout,
+        lambda el, t: el.dblclick(timeout=t),
+        lambda: page.dblclick(selector, timeout=timeout),
+    )
     return {"dblclicked": selector}
 
 
@@ -223,7 +314,11 @@ async def _act_hover(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not selector:
         raise ValueError("hover: 'target.selector' is required")
     timeout = _get_timeout(message.get("options"))
-    await page.hover(selector, timeout=timeout)
+    await with_element(
+        page, selector, timeout,
+        lambda el, t: el.hover(timeout=t),
+        lambda: page.hover(selector, timeout=timeout),
+    )
     return {"hovered": selector}
 
 
@@ -236,7 +331,11 @@ async def _act_fill(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if value is None:
         raise ValueError("fill: 'value' is required")
     timeout = _get_timeout(message.get("options"))
-    await page.fill(selector, str(value), timeout=timeout)
+    await with_element(
+        page, selector, timeout,
+        lambda el, t: el.fill(str(value), timeout=t),
+        lambda: page.fill(selector, str(value), timeout=timeout),
+    )
     return {"filled": selector, "valueLength": len(str(value))}
 
 
@@ -249,7 +348,11 @@ async def _act_type(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if text is None:
         raise ValueError("type: 'value' is required")
     timeout = _get_timeout(message.get("options"))
-    await page.type(selector, str(text), timeout=timeout)
+    await with_element(
+        page, selector, timeout,
+        lambda el, t: el.type(str(text), timeout=t),
+        lambda: page.type(selector, str(text), timeout=timeout),
+    )
     return {"typed": selector, "textLength": len(str(text))}
 
 
@@ -262,7 +365,11 @@ async def _act_press(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not key:
         raise ValueError("press: 'value' or options.key is required (e.g., 'Enter')")
     timeout = _get_timeout(message.get("options"))
-    await page.press(selector, key, timeout=timeout)
+    await with_element(
+        page, selector, timeout,
+        lambda el, t: el.press(key, timeout=t),
+        lambda: page.press(selector, key, timeout=timeout),
+    )
     return {"pressed": key, "on": selector}
 
 
@@ -275,23 +382,27 @@ async def _act_selectOption(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if value is None:
         raise ValueError("selectOption: 'value' is required (string | list | dict)")
     timeout = _get_timeout(message.get("options"))
-    selected = await page.select_option(selector, value, timeout=timeout)
+    selected = await with_element(
+        page, selector, timeout,
+        lambda el, t: el.select_option(value, timeout=t),
+        lambda: page.select_option(selector, value, timeout=timeout),
+    )
     return {"selected": selected}
 
 
 ## Removed uploadFile action
 
 
-async def _expect_exists(page, selector: str, timeout: int, state: str = "attached"):
-    await page.wait_for_selector(selector, state=state, timeout=timeout)
+# Assertions are delegated to Playwright's `expect`, which re-evaluates the condition
+# inside the browser and resolves in a single round-trip as soon as it holds.
+# They always query the live DOM, never the locator cache.
+async def _expect_exists(page, selector: str, timeout: int):
+    await expect(page.locator(selector).first).to_be_attached(timeout=timeout)
 
 
 async def _expect_not_exists(page, selector: str, timeout: int):
-    # If not present immediately, pass; otherwise wait until detached
-    el = await page.query_selector(selector)
-    if el is None:
-        return
-    await page.wait_for_selector(selector, state="detached", timeout=timeout)
+    # Passes immediately when nothing matches, otherwise once every match is detached
+    await expect(page.locator(selector)).to_have_count(0, timeout=timeout)
 
 
 async def _act_expectExists(page, message: Dict[str, Any]) -> Dict[str, Any]:
@@ -320,7 +431,7 @@ async def _act_expectVisible(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not selector:
         raise ValueError("expectVisible: 'target.selector' is required")
     timeout = _get_timeout(message.get("options"))
-    await page.wait_for_selector(selector, state="visible", timeout=timeout)
+    await expect(page.locator(selector).first).to_be_visible(timeout=timeout)
     return {"visible": True, "selector": selector}
 
 
@@ -333,17 +444,9 @@ async def _act_expectTextContains(page, message: Dict[str, Any]) -> Dict[str, An
     if needle is None:
         raise ValueError("expectTextContains: 'value' is required")
     timeout = _get_timeout(message.get("options"))
-    deadline = time.monotonic() + (timeout / 1000.0)
-    last_text = None
-    while time.monotonic() < deadline:
-        try:
-            last_text = await page.locator(selector).inner_text(timeout=500)
-            if needle in last_text:
-                return {"contains": True, "selector": selector}
-        except Exception:
-            await asyncio.sleep(0.05)
-        await asyncio.sleep(0.05)
-    raise TimeoutError(f"Text did not contain '{needle}' within {timeout}ms. Last text: {last_text}")
+    # inner_text semantics (rendered text), as before
+    await expect(page.locator(selector).first).to_contain_text(str(needle), timeout=timeout, use_inner_text=True)
+    return {"contains": True, "selector": selector}
 
 
 async def _act_expectUrlMatches(page, message: Dict[str, Any]) -> Dict[str, Any]:
@@ -351,25 +454,29 @@ async def _act_expectUrlMatches(page, message: Dict[str, Any]) -> Dict[str, Any]
     if not pattern:
         raise ValueError("expectUrlMatches: 'value' or options.pattern is required")
     flags = re.IGNORECASE if (message.get("options") or {}).get("ignoreCase") else 0
-    url = page.url
-    if re.search(pattern, url, flags):
-        return {"url": url, "matches": True}
-    raise AssertionError(f"URL '{url}' does not match pattern '{pattern}'")
+    regex = compile_regex(pattern, flags)
+    # page.url is known locally, so an already-matching URL needs no browser round-trip
+    if not regex.search(page.url):
+        await expect(page).to_have_url(regex, timeout=_get_timeout(message.get("options")))
+    return {"url": page.url, "matches": True}
 
 
 async def _act_expectTitle(page, message: Dict[str, Any]) -> Dict[str, Any]:
     expected = message.get("value")
     mode = (message.get("options") or {}).get("mode", "equals")  # equals | contains | regex
-    title = await page.title()
     if expected is None:
         raise ValueError("expectTitle: 'value' is required")
-    if mode == "equals" and title == expected:
-        return {"title": title, "matches": True}
-    if mode == "contains" and expected in title:
-        return {"title": title, "matches": True}
-    if mode == "regex" and re.search(expected, title):
-        return {"title": title, "matches": True}
-    raise AssertionError(f"Title '{title}' did not match ({mode}) '{expected}'")
+    if mode == "equals":
+        matcher = expected
+    elif mode == "contains":
+        matcher = compile_regex(re.escape(expected))
+    elif mode == "regex":
+        matcher = compile_regex(expected)
+    else:
+        raise ValueError(f"expectTitle: unknown mode '{mode}' (equals | contains | regex)")
+    await expect(page).to_have_title(matcher, timeout=_get_timeout(message.get("options")))
+    # The page's actual title, as clients got before the assertion moved to `expect`
+    return {"title": await page.title(), "mode": mode, "matches": True}
 
 
 async def _act_getText(page, message: Dict[str, Any]) -> Dict[str, Any]:
@@ -378,7 +485,11 @@ async def _act_getText(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not selector:
         raise ValueError("getText: 'target.selector' is required")
     timeout = _get_timeout(message.get("options"))
-    value = await page.locator(selector).inner_text(timeout=timeout)
+    value = await with_element(
+        page, selector, timeout,
+        lambda el, t: el.inner_text(),
+        lambda: page.locator(selector).inner_text(timeout=timeout),
+    )
     return {"value": value}
 
 
@@ -391,7 +502,11 @@ async def _act_getAttribute(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not name:
         raise ValueError("getAttribute: 'value' or options.name is required")
     timeout = _get_timeout(message.get("options"))
-    value = await page.locator(selector).get_attribute(name, timeout=timeout)
+    value = await with_element(
+        page, selector, timeout,
+        lambda el, t: el.get_attribute(name),
+        lambda: page.locator(selector).get_attribute(name, timeout=timeout),
+    )
     return {"name": name, "value": value}
 
 
@@ -401,7 +516,11 @@ async def _act_getValue(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if not selector:
         raise ValueError("getValue: 'target.selector' is required")
     timeout = _get_timeout(message.get("options"))
-    value = await page.locator(selector).input_value(timeout=timeout)
+    value = await with_element(
+        page, selector, timeout,
+        lambda el, t: el.input_value(timeout=t),
+        lambda: page.locator(selector).input_value(timeout=timeout),
+    )
     return {"value": value}
 
 
@@ -415,19 +534,45 @@ async def _act_getUrl(page, message: Dict[str, Any]) -> Dict[str, Any]:
 
 
 async def _act_screenshot(page, message: Dict[str, Any]) -> Dict[str, Any]:
-    full_page = bool((message.get("options") or {}).get("fullPage"))
-    b64 = await _screenshot_base64(page, full_page=full_page)
-    return {"screenshot": b64, "fullPage": full_page}
+    opts = message.get("options") or {}
+    full_page = bool(opts.get("fullPage"))
+    send_bytes = message.get("_send_bytes")
+    transport = opts.get("transport") or ("binary" if send_bytes else "base64")
+    if transport == "base64" and not any(k in opts for k in ("format", "quality", "clip", "scale")):
+        b64 = await _screenshot_base64(page, full_page=full_page)
+        return {"screenshot": b64, "fullPage": full_page}
+
+    data = await _capture_screenshot(page, opts)
+    fmt = opts.get("format", "png")
+    if transport == "base64":
+        b64 = await asyncio.to_thread(base64.b64encode, data) if len(data) > OFFLOAD_BYTES else base64.b64encode(data)
+        return {"screenshot": b64.decode("utf-8"), "fullPage": full_page, "format": fmt}
+    if not send_bytes:
+        raise ValueError("screenshot: binary transport needs a WebSocket connection")
+
+    digest = (
+        await asyncio.to_thread(lambda: hashlib.blake2b(data, digest_size=16).hexdigest())
+        if len(data) > OFFLOAD_BYTES else hashlib.blake2b(data, digest_size=16).hexdigest()
+    )
+    # Skip resending a frame identical to the last one this client received
+    session = message.get("_session")
+    state = session.state if session else {}
+    if state.get("lastScreenshotHash") == digest and not opts.get("force"):
+        return {"unchanged": True, "hash": digest, "fullPage": full_page, "format": fmt}
+
+    header = {"type": "screenshot", "id": message.get("id"), "mime": SCREENSHOT_FORMATS[fmt], "hash": digest}
+    await send_bytes(encode_binary_frame(header, data))
+    state["lastScreenshotHash"] = digest
+    return {"binary": True, "bytes": len(data), "hash": digest, "fullPage": full_page, "format": fmt}
 
 
 async def _act_setViewport(page, message: Dict[str, Any]) -> Dict[str, Any]:
-    ctx = get_browser_context()
     opts = message.get("options") or {}
     width = opts.get("width")
     height = opts.get("height")
     if not (width and height):
         raise ValueError("setViewport: options.width and options.height are required")
-    await ctx.set_viewport_size({"width": int(width), "height": int(height)})
+    await page.set_viewport_size({"width": int(width), "height": int(height)})
     return {"width": int(width), "height": int(height)}
 
 
@@ -449,13 +594,23 @@ async def _act_switchFrame(page, message: Dict[str, Any]) -> Dict[str, Any]:
     if name:
         frame = page.frame(name=name)
     if frame is None and url:
-        frame = page.frame(url=re.compile(url))
+        frame = page.frame(url=compile_regex(url))
     if not frame:
         raise ValueError("switchFrame: frame not found")
     # Note: We return frame info; actions should specify frame selectors directly using frame locators in future
     return {"frameName": frame.name, "url": frame.url}
 
 
+async def _act_setRouting(page, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply a routing profile (name or inline spec) to the page until changed; "none" clears it."""
+    profile = message.get("value") or (message.get("options") or {}).get("profile")
+    if profile is None:
+        raise ValueError("setRouting: 'value' (profile name) or options.profile is required")
+    state = routing_for(page)
+    await state.set_profile(resolve_profile(profile))
+    return state.stats()
+
+
 async def _act_evalJs(page, message: Dict[str, Any]) -> Dict[str, Any]:
     expr = message.get("value")
     if not expr:
@@ -469,6 +624,113 @@ async def _act_evalJs(page, message: Dict[str, Any]) -> Dict[str, Any]:
     return {"value": result}
 
 
+async def _act_startScreencast(page, message: Dict[str, Any]) -> Dict[str, Any]:
+    session = message.get("_session")
+    send_bytes = message.get("_send_bytes")
+    if not (session and send_bytes):
+        raise ValueError("startScreencast: needs a WebSocket connection")
+    return await screencast.subscribe(page, session, send_bytes, message.get("options") or {})
+
+
+async def _act_stopScreencast(page, message: Dict[str, Any]) -> Dict[str, Any]:
+    session = message.get("_session")
+    if not session:
+        raise ValueError("stopScreencast: needs a WebSocket connection")
+    return await screencast.unsubscribe(page, session)
+
+
+async def _act_runScript(page, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a saved script (by name) or an inline step list in a single round-trip."""
+    opts = message.get("options") or {}
+    name = message.get("value") or opts.get("name")
+    steps = opts.get("steps")
+    if steps is None and not name:
+        raise ValueError("runScript: 'value' (script name) or options.steps is required")
+    if steps is not None and not isinstance(steps, list):
+        raise ValueError("runScript: options.steps must be a list")
+    # Validated up front (cached per file version / step content), so a bad step fails before the run
+    try:
+        plan = compile_script(name, ACTION_HANDLERS) if steps is None else compile_inline(steps, ACTION_HANDLERS)
+    except CompileError as e:
+        raise ValueError(f"runScript: {e}")
+
+    send = message.get("_send")
+    message_id = message.get("id")
+    trace = bool(opts.get("trace"))
+    if trace:
+        await start_trace(page, title=name or "inline")
+
+    history_steps = []
+
+    async def on_step(result: Dict[str, Any]):
+        history_steps.append({**result, "at": time.time() - result["details"].get("elapsedMs", 0) / 1000})
+        if send:
+            await send({"type": "step_result", "id": message_id, **result})
+
+    # options.routing overrides the profile saved with the script
+    routing = opts.get("routing", plan.routing)
+    # options.har: "record" | "replay" | {"mode", "notFound", "url", "name"}
+    har = opts.get("har")
+    if isinstance(har, str):
+        har = {"mode": har}
+    cache = cache_before = None
+    try:
+        async with AsyncExitStack() as stack:
+            har_scope = None
+            run_page = page
+            if har:
+                har_scope = await stack.enter_async_context(HarScope(
+                    page,
+                    har.get("name") or name or "inline",
+                    har.get("mode", "replay"),
+                    har.get("notFound", DEFAULT_NOT_FOUND),
+                    har.get("url"),
+                ))
+                # Replay runs on its own page, closed again when the scope exits
+                run_page = har_scope.page
+            cache = cache_for(run_page)
+            cache_before = cache.stats() if cache else None
+            scope = await stack.enter_async_context(ProfileScope(run_page, routing)) if routing is not None else None
+            summary = await run_steps(
+                run_page,
+                plan,
+                ACTION_HANDLERS,
+                variables=dict(opts.get("vars") or {}),
+                on_step=on_step,
+                stop_on_error=opts.get("stopOnError", True),
+                profile=bool(opts.get("profile")),
+                include_stack=bool(message.get("_stack")),
+            )
+    finally:
+        if trace:
+            trace_path = await stop_trace(page, _sanitize_name(name) if name else "inline")
+    if scope:
+        summary["routing"] = scope.report
+    if cache:
+        summary["locatorCache"] = cache_stats_delta(cache_before, cache.stats())
+    if har_scope:
+        summary["har"] = har_scope.report
+    if trace:
+        summary["trace"] = trace_path
+    # Inline runs from the extension ("Run all") carry the open script's name in options.name
+    if steps is None or name:
+        script = plan.name if steps is None else _sanitize_name(name)
+        SCRIPT_STORE.record_run(script, summary["failed"] == 0, summary["totalMs"], summary["failed"])
+        # Queued here, written in batches by the history thread
+        RUN_HISTORY.record(script, history_steps, summary["failed"] == 0, summary["totalMs"])
+    return {"script": name, "ok": summary["failed"] == 0, **summary}
+
+
+async def _act_startTrace(page, message: Dict[str, Any]) -> Dict[str, Any]:
+    await start_trace(page, title=message.get("value"))
+    return {"tracing": True}
+
+
+async def _act_stopTrace(page, message: Dict[str, Any]) -> Dict[str, Any]:
+    name = _sanitize_name(message.get("value") or "session")
+    return {"tracing": False, "trace": await stop_trace(page, name)}
+
+
 # Dispatcher map
 ACTION_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
     # Navigation
@@ -510,59 +772,153 @@ ACTION_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, A
     "setViewport": _act_setViewport,
     "setDefaultTimeout": _act_setDefaultTimeout,
     "switchFrame": _act_switchFrame,
+    "setRouting": _act_setRouting,
     # Utilities
     "evalJs": _act_evalJs,
+    # Live view
+    "startScreencast": _act_startScreencast,
+    "stopScreencast": _act_stopScreencast,
+    # Scripts
+    "runScript": _act_runScript,
+    "startTrace": _act_startTrace,
+    "stopTrace": _act_stopTrace,
 }
 
+# Actions that do not change page state; the scheduler may run these concurrently
+READ_ONLY_ACTIONS = {"getText", "getAttribute", "getValue", "getContent", "getUrl", "screenshot"}
+
+
+async def _execute(page, message: Dict[str, Any], extra: Dict[str, Any], timing: Dict[str, int], stack: bool) -> Dict[str, Any]:
+    """Run one command and build its result frame (never raises)."""
+    action = message.get("action")
+    handler = ACTION_HANDLERS.get(action)
+    started = time.monotonic()
+    try:
+        if not handler:
+            raise ValueError(f"Unknown action: {action}")
+        profile = bool((message.get("options") or {}).get("profile"))
+
+        async def attempt(msg: Dict[str, Any]):
+            return await run_timed(page, msg, handler, profile=profile)
+
+        # Steps sent one by one (content.js runStep) carry their own retries/retryDelayMs
+        (details, phases), attempts = await run_with_retries(
+            attempt, {**message, **extra}, int(message.get("retries") or 0), message.get("retryDelayMs")
+        )
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        ACTION_DURATION.observe(time.monotonic() - started, action)
+        details = {**details, "elapsedMs": elapsed_ms, "timing": {**timing, **phases}}
+        if attempts > 1:
+            details["attempts"] = attempts
+        return _build_ok(message.get("id"), details)
+    except Exception as e:
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        # Unknown actions are bucketed together to keep label cardinality bounded
+        label = action if handler else "<unknown>"
+        ACTION_DURATION.observe(time.monotonic() - started, label)
+        ACTION_ERRORS.inc(label, e.__class__.__name__)
+        response = _build_error(message.get("id"), action or "<none>", e, elapsed_ms, stack)
+        if getattr(e, "attempts", 1) > 1:
+            response["details"]["attempts"] = e.attempts
+        response["details"]["timing"] = {**timing, **getattr(e, "timing", {})}
+        return response
+
+
+async def process_message(
+    data: Union[str, Dict[str, Any]],
+    manager: ConnectionManager,
+    websocket: WebSocket,
+    session: Optional[BrowserSession] = None,
+    protocol: Optional[Protocol] = None,
+):
+    protocol = protocol or Protocol()
+
+    async def send(payload: Dict[str, Any]):
+        await manager.send_frame(protocol.encode(payload), websocket)
+
+    async def send_bytes(data: bytes):
+        await manager.send_personal_bytes(data, websocket)
 
-async def process_message(data: str, manager: ConnectionManager, websocket: WebSocket):
     try:
-        message = json.loads(data)
-        logger.info("Processing incoming message: %s", message)
-
-        # Send processing status as early feedback
-        await manager.send_personal_message(json.dumps({
-            "type": "processing",
-            "id": message.get("id"),
-            "message": "Processing your request with Playwright..."
-        }), websocket)
-
-        # Use Playwright to interact with the page
-        current_page = get_current_page()
+        message = json.loads(data) if isinstance(data, str) else data
+        logger.debug("Processing incoming message: %s", message.get("type") or message.get("action"))
+
+        timing: Dict[str, int] = {}
+        if "_received" in message:
+            timing["queueMs"] = int((time.perf_counter() - message["_received"]) * 1000)
+
+        # Early feedback, unless the client opted out (per connection or per message)
+        if message.get("ack", protocol.ack):
+            ack_started = time.perf_counter()
+            await send({
+                "type": "processing",
+                "id": message.get("id"),
+                "message": "Processing your request with Playwright..."
+            })
+            timing["ackMs"] = int((time.perf_counter() - ack_started) * 1000)
+
+        # Use Playwright to interact with the connection's page (launches the browser on first use)
+        try:
+            current_page = await resolve_page(session)
+        except Exception as e:
+            logger.warning(f"Browser launch failed when processing message: {e}")
+            current_page = None
         if not current_page:
             logger.warning("Playwright not ready when processing message")
-            await manager.send_personal_message(json.dumps({
+            await send({
                 "type": "result",
                 "id": message.get("id"),
                 "status": "error",
                 "error": {"name": "PlaywrightNotReady", "message": "Playwright not ready"},
                 "details": {"elapsedMs": 0}
-            }), websocket)
+            })
             return
 
-        action = message.get("action")
-        handler = ACTION_HANDLERS.get(action)
-        if not handler:
-            raise ValueError(f"Unknown action: {action}")
-
-        started = time.monotonic()
-        try:
-            details = await handler(current_page, message)
-            elapsed_ms = int((time.monotonic() - started) * 1000)
-            details = {**(details or {}), "elapsedMs": elapsed_ms}
-
-            # Include screenshot only for explicit screenshot action
-            response = _build_ok(message.get("id"), details)
-            await manager.send_personal_message(json.dumps(response), websocket)
-        except Exception as e:
-            elapsed_ms = int((time.monotonic() - started) * 1000)
-            response = _build_error(message.get("id"), action or "<none>", e, elapsed_ms)
-            await manager.send_personal_message(json.dumps(response), websocket)
+        stack = bool(message.get("stack", protocol.stack))
+        extra = {"_send": send, "_send_bytes": send_bytes, "_session": session, "_stack": stack}
+        if message.get("type") == "batch":
+            response = await _execute_batch(current_page, message, extra, timing, stack)
+        else:
+            response = await _execute(current_page, message, extra, timing, stack)
+        send_started = time.perf_counter()
+        await send(response)
+        SEND_DURATION.observe(time.perf_counter() - send_started)
 
     except json.JSONDecodeError:
         logger.error("Received invalid JSON format from client")
-        error_response = {
+        await send({
             "type": "error",
             "message": "Invalid JSON format"
-        }
-        await manager.send_personal_message(json.dumps(error_response), websocket)
+        })
+
+
+async def _execute_batch(page, batch: Dict[str, Any], extra: Dict[str, Any], timing: Dict[str, int], stack: bool) -> Dict[str, Any]:
+    """Run a batch's commands in order and combine their results into one frame."""
+    commands = batch.get("commands")
+    if not isinstance(commands, list):
+        return _build_error(batch.get("id"), "batch", ValueError("'commands' must be a list"), 0, stack)
+    stop_on_error = batch.get("stopOnError", False)
+    started = time.monotonic()
+    results = []
+    for command in commands:
+        if not isinstance(command, dict):
+            command = {"action": None}
+        result = await _execute(page, command, extra, {}, stack)
+        # The batch frame carries the envelope; keep only what differs per command
+        results.append({k: v for k, v in result.items() if k != "type"})
+        if result["status"] == "error" and stop_on_error:
+            break
+    failed = sum(1 for r in results if r["status"] == "error")
+    return {
+        "type": "result",
+        "id": batch.get("id"),
+        "status": "ok" if failed == 0 else "error",
+        "results": results,
+        "details": {
+            "total": len(commands),
+            "executed": len(results),
+            "failed": failed,
+            "elapsedMs": int((time.monotonic() - started) * 1000),
+            "timing": timing,
+        },
+    }
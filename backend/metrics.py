@@ -0,0 +1,153 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import math
+
+# Latency buckets in seconds, from cheap getters (~1 ms) to slow navigations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        # Unlabelled series start at 0 so they are exported before the first update
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labels else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_label_str(self.labels, k)} {_fmt(v)}" for k, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """A gauge that is either set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labels else {(): 0.0}
+        self._func = func
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, func: Callable[[], float]):
+        self._func = func
+
+    def render(self) -> List[str]:
+        if self._func is not None:
+            return self.header() + [f"{self.name} {_fmt(self._func())}"]
+        return self.header() + [
+            f"{self.name}{_label_str(self.labels, k)} {_fmt(v)}" for k, v in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is a bisect plus two additions."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _fmt(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ACTION_DURATION = REGISTRY.register(Histogram(
+    "playtest_action_duration_seconds", "Time spent executing an action handler.", ["action"]))
+ACTION_ERRORS = REGISTRY.register(Counter(
+    "playtest_action_errors_total", "Actions that finished with an error.", ["action", "error"]))
+ACTIVE_CONNECTIONS = REGISTRY.register(Gauge(
+    "playtest_active_connections", "Open WebSocket connections."))
+QUEUED_COMMANDS = REGISTRY.register(Gauge(
+    "playtest_queued_commands", "Commands accepted but not finished, across all connections."))
+SEND_DURATION = REGISTRY.register(Histogram(
+    "playtest_result_send_duration_seconds", "Time spent encoding and sending a result frame."))
+BROWSER_LAUNCHES = REGISTRY.register(Counter(
+    "playtest_browser_launches_total", "Browser processes launched (first start and restarts)."))
+SLOW_CONSUMER_EVENTS = REGISTRY.register(Counter(
+    "playtest_slow_consumer_events_total", "Broadcast frames that found a client's outbox full, by policy.", ["policy"]))
+LOCATOR_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "playtest_locator_cache_lookups_total", "Element lookups by outcome: hits, misses, stale handles.", ["result"]))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    "playtest_event_loop_lag_seconds", "How late a periodic event-loop probe woke up."))
@@ -2,7 +2,16 @@ from contextlib import asynccontextmanager
 from playwright.async_api import async_playwright
 from pathlib import Path
 from fastapi import FastAPI
+from collections import deque
+from typing import Any, Dict, Optional
+import asyncio
 import logging
+import os
+import shutil
+import tempfile
+import time
+from metrics import BROWSER_LAUNCHES
+from loop_monitor import LOOP_MONITOR
 
 # Use Uvicorn's logger for colorized output consistent with server logs
 logger = logging.getLogger("uvicorn.error")
@@ -11,48 +20,214 @@ logger = logging.getLogger("uvicorn.error")
 playwright_instance = None
 browser_context = None
 current_page = None
+pool_browser = None
+context_pool = None
+profile_tmp_dir = None
+browser_state = "not_started"  # not_started | starting | ready | failed
+browser_error = None
+browser_launches = 0
+_browser_lock = None
+_prewarm_task = None
 
-@asynccontextmanager
-async def playwright_lifespan(app: FastAPI):
+# Browser launch settings; `start_server.py --prod` switches these to fast-start defaults
+HEADLESS = os.environ.get("PLAYTEST_HEADLESS", "0") == "1"
+# eager: launch before serving | background: pre-warm while serving | lazy: launch on first command
+BROWSER_LAUNCH = os.environ.get("PLAYTEST_BROWSER_LAUNCH", "eager")
+# Persistent profile directory, or "ephemeral" for a throw-away temp profile
+PROFILE_DIR = os.environ.get("PLAYTEST_PROFILE", "user-data")
+# Optional profile copied into the ephemeral profile before launch
+PROFILE_TEMPLATE = os.environ.get("PLAYTEST_PROFILE_TEMPLATE", "")
+# Page opened after launch; empty skips the initial navigation
+START_URL = os.environ.get("PLAYTEST_START_URL", "https://example.com")
+EXT_DIR = str(Path(__file__).parent.parent / "extension")
+
+# Startup phase durations in ms (import, playwright_start, browser_launch, first_page, ...)
+STARTUP_TIMINGS: Dict[str, int] = {}
+
+# Per-connection context pool; a max size of 0 disables it and all connections share `current_page`
+CONTEXT_POOL_MAX = int(os.environ.get("PLAYTEST_CONTEXT_POOL_MAX", "0"))
+CONTEXT_POOL_MIN = int(os.environ.get("PLAYTEST_CONTEXT_POOL_MIN", "1"))
+CONTEXT_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("PLAYTEST_CONTEXT_POOL_TIMEOUT", "60"))
+DEFAULT_VIEWPORT = {"width": 1440, "height": 900}
+
+
+class BrowserSession:
+    """Browser context and page assigned to one WebSocket connection."""
+
+    def __init__(self, context, page, pooled: bool = False):
+        self.context = context
+        self.page = page
+        self.pooled = pooled
+        # Per-connection scratch space for action handlers
+        self.state: Dict[str, Any] = {}
+
+
+class ContextPool:
     """
-    Manages Playwright browser lifecycle for the FastAPI application.
-    Handles startup (browser initialization) and shutdown (cleanup) automatically.
+    Bounded pool of isolated browser contexts.
+    At most `max_size` contexts are handed out at once; further acquirers queue.
+    Released contexts are closed and replaced by fresh ones, so no cookies or
+    storage leak between connections, while `min_size` contexts are kept warm.
     """
-    # Startup: Initialize Playwright
-    global playwright_instance, browser_context, current_page
-    
-    logger.info("Starting Playwright instance...")
-    playwright_instance = await async_playwright().start()
-    
-    # Set up extension directory with absolute path
-    EXT_DIR = str(Path(__file__).parent.parent / "extension")
-    logger.info(f"Extension directory: {EXT_DIR}")
-    
+
+    def __init__(self, browser, max_size: int, min_size: int = 0, context_options: Optional[Dict[str, Any]] = None):
+        self._browser = browser
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self._context_options = context_options or {"viewport": DEFAULT_VIEWPORT}
+        self._idle = deque()
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._warming = set()
+        self._closed = False
+        self.in_use = 0
+        self.waiting = 0
+
+    @property
+    def available(self) -> int:
+        return self.max_size - self.in_use
+
+    async def _create(self):
+        context = await self._browser.new_context(**self._context_options)
+        try:
+            page = await context.new_page()
+        except BaseException:
+            await _close_quietly(context)
+            raise
+        return context, page
+
+    async def _warm_one(self):
+        try:
+            context, page = await self._create()
+        except Exception as e:
+            logger.warning(f"Failed to pre-warm browser context: {e}")
+            return
+        if self._closed:
+            # Finished warming after close(): nobody will take it
+            await _close_quietly(context)
+            return
+        self._idle.append((context, page))
+
+    def _refill(self):
+        if self._closed:
+            return
+        missing = self.min_size - len(self._idle) - len(self._warming)
+        for _ in range(max(0, missing)):
+            task = asyncio.create_task(self._warm_one())
+            self._warming.add(task)
+            task.add_done_callback(self._warming.discard)
+
+    async def start(self):
+        self._refill()
+        if self._warming:
+            await asyncio.gather(*self._warming, return_exceptions=True)
+
+    async def acquire(self, timeout: Optional[float] = None) -> BrowserSession:
+        if self._closed:
+            raise RuntimeError("Browser context pool is closed")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        finally:
+            self.waiting -= 1
+        try:
+            context, page = self._idle.popleft() if self._idle else await self._create()
+        except BaseException:
+            # Also on cancellation (client gone while the context was created): the slot must come back
+            self._slots.release()
+            raise
+        self.in_use += 1
+        self._refill()
+        return BrowserSession(context, page, pooled=True)
+
+    async def release(self, session: BrowserSession):
+        self.in_use -= 1
+        try:
+            await session.context.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled browser context: {e}")
+        finally:
+            self._slots.release()
+            self._refill()
+
+    async def close(self):
+        self._closed = True
+        warming = list(self._warming)
+        for task in warming:
+            task.cancel()
+        if warming:
+            await asyncio.gather(*warming, return_exceptions=True)
+        while self._idle:
+            context, _ = self._idle.popleft()
+            await _close_quietly(context)
+
+
+async def _close_quietly(context):
+    try:
+        await context.close()
+    except Exception:
+        pass
+
+
+def record_startup_phase(phase: str, started: float):
+    """Record the duration of a startup phase that began at `started` (time.perf_counter)."""
+    STARTUP_TIMINGS[phase] = int((time.perf_counter() - started) * 1000)
+    logger.info(f"Startup phase '{phase}' took {STARTUP_TIMINGS[phase]} ms")
+
+
+def _prepare_profile() -> str:
+    global profile_tmp_dir
+    if PROFILE_DIR != "ephemeral":
+        return PROFILE_DIR
+    profile_tmp_dir = tempfile.mkdtemp(prefix="playtest-profile-")
+    if PROFILE_TEMPLATE:
+        # Start from a prepared profile (logins, settings) without ever mutating the template
+        shutil.copytree(PROFILE_TEMPLATE, profile_tmp_dir, dirs_exist_ok=True)
+    return profile_tmp_dir
+
+
+def _extension_args():
     # Verify extension directory exists
     if not Path(EXT_DIR).exists():
         logger.error(f"Extension directory not found: {EXT_DIR}")
         raise FileNotFoundError(f"Extension directory not found: {EXT_DIR}")
-    
+
     # Verify manifest.json exists
     manifest_path = Path(EXT_DIR) / "manifest.json"
     if not manifest_path.exists():
         logger.error(f"Manifest file not found: {manifest_path}")
         raise FileNotFoundError(f"Manifest file not found: {manifest_path}")
-    
+
     logger.info(f"Loading extension from: {EXT_DIR}")
+    return [
+        f"--disable-extensions-except={EXT_DIR}",
+        f"--load-extension={EXT_DIR}",
+    ]
+
 
-    user_data_dir = f"user-data"
+async def _launch_browser():
+    global playwright_instance, browser_context, current_page, pool_browser, context_pool, browser_launches
+
+    started = time.perf_counter()
+    logger.info("Starting Playwright instance...")
+    playwright_instance = await async_playwright().start()
+    record_startup_phase("playwright_start", started)
+
+    # The extension UI needs a headed browser; headless instances are driven over the WebSocket only
+    args = ["--high-dpi-support=1", "--force-device-scale-factor=1"]
+    if not HEADLESS:
+        args = _extension_args() + args
+
+    started = time.perf_counter()
     browser_context = await playwright_instance.chromium.launch_persistent_context(
-        user_data_dir,
-        headless=False,
-        args=[
-            f"--disable-extensions-except={EXT_DIR}",
-            f"--load-extension={EXT_DIR}",
-            "--high-dpi-support=1",
-            "--force-device-scale-factor=1",
-        ],
+        _prepare_profile(),
+        headless=HEADLESS,
+        args=args,
     )
-    
+    browser_launches += 1
+    BROWSER_LAUNCHES.inc()
+    record_startup_phase("browser_launch", started)
+
+    started = time.perf_counter()
     # Reuse the existing page to avoid opening a new one
     pages = browser_context.pages
     if pages and len(pages) > 0:
@@ -63,22 +238,100 @@ async def playwright_lifespan(app: FastAPI):
 
     # Normalize viewport to reduce OS/zoom related UI glitches
     try:
-        await current_page.set_viewport_size({"width": 1440, "height": 900})
+        await current_page.set_viewport_size(DEFAULT_VIEWPORT)
     except Exception as e:
         logger.warning(f"Failed to set viewport size: {e}")
-    
-    
+
     # Navigate to initial page
-    await current_page.goto("https://example.com", wait_until="domcontentloaded")
-    
-    yield  # Server is running
-    
-    # Shutdown: Clean up Playwright
-    logger.info("Shutting down Playwright instance...")
+    if START_URL:
+        try:
+            await current_page.goto(START_URL, wait_until="domcontentloaded")
+        except Exception as e:
+            # Offline machines (HAR replay) must still be able to start
+            logger.warning(f"Initial navigation to {START_URL} failed: {e}")
+    record_startup_phase("first_page", started)
+
+    # Optional pool of isolated contexts, one per WebSocket connection
+    if CONTEXT_POOL_MAX > 0:
+        started = time.perf_counter()
+        logger.info(f"Starting context pool (max={CONTEXT_POOL_MAX}, warm={CONTEXT_POOL_MIN})")
+        pool_browser = await playwright_instance.chromium.launch(headless=True)
+        browser_launches += 1
+        BROWSER_LAUNCHES.inc()
+        context_pool = ContextPool(pool_browser, CONTEXT_POOL_MAX, CONTEXT_POOL_MIN)
+        await context_pool.start()
+        record_startup_phase("context_pool", started)
+
+
+async def ensure_browser():
+    """Launch the browser if it is not running yet; concurrent callers share one launch."""
+    global browser_state, browser_error, _browser_lock
+    if browser_state == "ready":
+        return
+    if _browser_lock is None:
+        _browser_lock = asyncio.Lock()
+    async with _browser_lock:
+        if browser_state == "ready":
+            return
+        browser_state = "starting"
+        started = time.perf_counter()
+        try:
+            await _launch_browser()
+        except Exception as e:
+            browser_state, browser_error = "failed", f"{e.__class__.__name__}: {e}"
+            logger.error(f"Failed to launch browser: {browser_error}")
+            try:
+                await _close_browser()
+            except Exception:
+                logger.exception("Failed to clean up after browser launch failure")
+            raise
+        browser_state, browser_error = "ready", None
+        record_startup_phase("browser_ready", started)
+
+
+async def _close_browser():
+    global playwright_instance, browser_context, current_page, pool_browser, context_pool, profile_tmp_dir
+    if context_pool:
+        await context_pool.close()
+    if pool_browser:
+        await pool_browser.close()
     if browser_context:
         await browser_context.close()
     if playwright_instance:
         await playwright_instance.stop()
+    if profile_tmp_dir:
+        shutil.rmtree(profile_tmp_dir, ignore_errors=True)
+    playwright_instance = browser_context = current_page = pool_browser = context_pool = profile_tmp_dir = None
+
+
+@asynccontextmanager
+async def playwright_lifespan(app: FastAPI):
+    """
+    Manages Playwright browser lifecycle for the FastAPI application.
+    Handles startup (browser initialization) and shutdown (cleanup) automatically.
+    With BROWSER_LAUNCH "background" or "lazy" the server accepts requests before the browser is up.
+    """
+    global _prewarm_task, browser_state
+    started = time.perf_counter()
+    lag_task = asyncio.create_task(LOOP_MONITOR.run())
+    logger.info(f"Browser launch mode: {BROWSER_LAUNCH} (headless={HEADLESS}, profile={PROFILE_DIR})")
+    if BROWSER_LAUNCH == "eager":
+        await ensure_browser()
+    elif BROWSER_LAUNCH == "background":
+        _prewarm_task = asyncio.create_task(ensure_browser())
+        # Failures are logged by ensure_browser and retried on the first command
+        _prewarm_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    record_startup_phase("server_ready", started)
+
+    yield  # Server is running
+
+    # Shutdown: Clean up Playwright
+    logger.info("Shutting down Playwright instance...")
+    if _prewarm_task and not _prewarm_task.done():
+        _prewarm_task.cancel()
+    await _close_browser()
+    lag_task.cancel()
+    browser_state = "not_started"
     logger.info("Playwright instance stopped.")
 
 def get_current_page():
@@ -92,3 +345,38 @@ def get_browser_context():
 def get_playwright_instance():
     """Get the current Playwright instance."""
     return playwright_instance
+
+def get_context_pool():
+    """Get the per-connection context pool, or None when pooling is disabled."""
+    return context_pool
+
+def get_startup_status() -> Dict[str, Any]:
+    """Browser state and timed startup phases, for cold-start monitoring."""
+    return {
+        "browser": browser_state,
+        "error": browser_error,
+        "launchMode": BROWSER_LAUNCH,
+        "headless": HEADLESS,
+        "launches": browser_launches,
+        "timingsMs": dict(STARTUP_TIMINGS),
+    }
+
+async def acquire_session(timeout: Optional[float] = CONTEXT_POOL_ACQUIRE_TIMEOUT) -> BrowserSession:
+    """Get a browser session for a new connection (isolated when pooling is enabled)."""
+    if CONTEXT_POOL_MAX > 0:
+        await ensure_browser()
+        return await context_pool.acquire(timeout)
+    # Shared sessions resolve the page per command, so the browser can start lazily
+    return BrowserSession(None, None)
+
+async def release_session(session: Optional[BrowserSession]):
+    """Return a connection's browser session to the pool."""
+    if session and session.pooled and context_pool:
+        await context_pool.release(session)
+
+async def resolve_page(session: Optional[BrowserSession] = None):
+    """Page a command should run on, launching the browser first if needed."""
+    if session and session.pooled:
+        return session.page
+    await ensure_browser()
+    return current_page
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Union
+import json
+
+# Optional compact encodings; JSON is always available
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover - optional dependency
+    cbor2 = None
+
+Frame = Union[str, bytes]
+
+
+def available_encodings() -> List[str]:
+    encodings = []
+    if msgpack is not None:
+        encodings.append("msgpack")
+    if cbor2 is not None:
+        encodings.append("cbor")
+    return encodings + ["json"]
+
+
+class Protocol:
+    """
+    Wire settings of one connection, negotiated with a hello frame:
+
+        -> {"type": "hello", "encodings": ["msgpack", "json"], "ack": false, "stack": false}
+        <- {"type": "hello", "encoding": "msgpack", "ack": false, "stack": false, "batch": true, ...}
+
+    The reply is JSON; afterwards messages in both directions use the chosen
+    encoding (msgpack/CBOR as binary frames). Media frames (screenshots,
+    screencast) keep their own layout and always start with a 0x00 byte,
+    which no encoded msgpack/CBOR map does.
+    """
+
+    def __init__(self):
+        self.encoding = "json"
+        # Send the "processing" frame before each command (clients may opt out)
+        self.ack = True
+        # Include Python stack traces in error results
+        self.stack = False
+
+    def negotiate(self, hello: Dict[str, Any]) -> Dict[str, Any]:
+        offered = hello.get("encodings") or ["json"]
+        self.encoding = next((e for e in offered if e in available_encodings()), "json")
+        if "ack" in hello:
+            self.ack = bool(hello["ack"])
+        if "stack" in hello:
+            self.stack = bool(hello["stack"])
+        return {
+            "type": "hello",
+            "encoding": self.encoding,
+            "encodings": available_encodings(),
+            "ack": self.ack,
+            "stack": self.stack,
+            "batch": True,
+        }
+
+    def encode(self, message: Dict[str, Any]) -> Frame:
+        if self.encoding == "msgpack":
+            return msgpack.packb(message, use_bin_type=True, default=str)
+        if self.encoding == "cbor":
+            return cbor2.dumps(message, default=lambda enc, v: enc.encode(str(v)))
+        return json.dumps(message)
+
+    def decode(self, frame: Frame) -> Any:
+        """Decode a client frame; text frames are JSON whatever was negotiated."""
+        if isinstance(frame, str):
+            return json.loads(frame)
+        if self.encoding == "msgpack":
+            return msgpack.unpackb(frame, raw=False)
+        if self.encoding == "cbor":
+            return cbor2.loads(frame)
+        return json.loads(frame.decode("utf-8"))
@@ -0,0 +1,196 @@
+from fnmatch import translate
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import urlparse
+import asyncio
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger("uvicorn.error")
+
+# Optional JSON file with extra profiles: {"name": {"blockTypes": [...], "blockUrls": [...], "stubHosts": [...], "latencyMs": 0}}
+PROFILES_FILE = os.environ.get("PLAYTEST_ROUTING_PROFILES")
+
+# Hosts of common analytics/ads/chat widgets; answered with an empty 204 instead of hitting the network
+TRACKER_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "connect.facebook.net", "hotjar.com", "segment.io", "segment.com", "mixpanel.com",
+    "clarity.ms", "intercom.io", "intercomcdn.com", "newrelic.com", "nr-data.net", "sentry.io",
+]
+
+BUILTIN_PROFILES: Dict[str, Dict[str, Any]] = {
+    "none": {},
+    # Everything a functional check rarely needs
+    "fast": {"blockTypes": ["image", "media", "font"]},
+    "no-trackers": {"stubHosts": TRACKER_HOSTS},
+    "lean": {"blockTypes": ["image", "media", "font"], "stubHosts": TRACKER_HOSTS},
+    # Adds latency to every request that still goes out
+    "slow": {"latencyMs": 400},
+}
+
+# Assumed cost of a blocked request until one of that type has been observed on the page
+DEFAULT_COST_MS = {"image": 80, "media": 300, "font": 60, "stylesheet": 60, "script": 80}
+FALLBACK_COST_MS = 50
+
+
+class RoutingProfile:
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.block_types = set(spec.get("blockTypes") or [])
+        # Glob patterns ("**/*.png") or regexes prefixed with "re:"
+        self.block_urls = [
+            re.compile(p[3:]) if p.startswith("re:") else re.compile(translate(p))
+            for p in (spec.get("blockUrls") or [])
+        ]
+        self.stub_hosts = [h.lower().lstrip(".") for h in (spec.get("stubHosts") or [])]
+        self.latency_ms = int(spec.get("latencyMs") or 0)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.block_types or self.block_urls or self.stub_hosts or self.latency_ms)
+
+    def is_stubbed(self, url: str) -> bool:
+        host = (urlparse(url).hostname or "").lower()
+        return any(host == h or host.endswith("." + h) for h in self.stub_hosts)
+
+    def is_blocked(self, resource_type: str, url: str) -> bool:
+        return resource_type in self.block_types or any(p.match(url) for p in self.block_urls)
+
+
+def _load_profiles() -> Dict[str, Dict[str, Any]]:
+    profiles = dict(BUILTIN_PROFILES)
+    if PROFILES_FILE:
+        try:
+            profiles.update(json.loads(Path(PROFILES_FILE).read_text("utf-8")))
+        except Exception as e:
+            logger.warning(f"Could not load routing profiles from {PROFILES_FILE}: {e}")
+    return profiles
+
+
+PROFILES = _load_profiles()
+
+
+def resolve_profile(profile: Union[str, Dict[str, Any], None]) -> Optional[RoutingProfile]:
+    """A profile by name, or an inline spec dict; None/"none" disables routing."""
+    if profile is None:
+        return None
+    if isinstance(profile, dict):
+        resolved = RoutingProfile("inline", profile)
+    else:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown routing profile '{profile}' (available: {', '.join(sorted(PROFILES))})")
+        resolved = RoutingProfile(profile, PROFILES[profile])
+    return None if resolved.empty else resolved
+
+
+class PageRouting:
+    """One `page.route` handler per page whose behaviour follows the active profile."""
+
+    def __init__(self, page):
+        self.page = page
+        self.profile: Optional[RoutingProfile] = None
+        self._installed = False
+        self.blocked = 0
+        self.stubbed = 0
+        self.delayed = 0
+        self.saved_ms = 0.0
+        # resource type -> [count, total ms] of requests that did go out
+        self._observed: Dict[str, List[float]] = {}
+        page.on("requestfinished", self._on_finished)
+
+    def _on_finished(self, request):
+        try:
+            duration = request.timing.get("responseEnd", -1)
+        except Exception:
+            return
+        if duration and duration > 0:
+            stats = self._observed.setdefault(request.resource_type, [0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+
+    def _cost(self, resource_type: str) -> float:
+        count, total = self._observed.get(resource_type, (0, 0.0))
+        return total / count if count else DEFAULT_COST_MS.get(resource_type, FALLBACK_COST_MS)
+
+    async def set_profile(self, profile: Optional[RoutingProfile]):
+        self.profile = profile
+        if profile and not self._installed:
+            await self.page.route("**/*", self._handle)
+            self._installed = True
+        elif not profile and self._installed:
+            await self.page.unroute("**/*", self._handle)
+            self._installed = False
+
+    async def _handle(self, route):
+        profile = self.profile
+        request = route.request
+        if profile is None:
+            return await route.fallback()
+        if profile.is_stubbed(request.url):
+            self.stubbed += 1
+            self.saved_ms += self._cost(request.resource_type)
+            return await route.fulfill(status=204, body="")
+        if profile.is_blocked(request.resource_type, request.url):
+            self.blocked += 1
+            self.saved_ms += self._cost(request.resource_type)
+            return await route.abort("blockedbyclient")
+        if profile.latency_ms:
+            self.delayed += 1
+            await asyncio.sleep(profile.latency_ms / 1000)
+        # fallback (not continue_) so context-level routes such as HAR replay still apply
+        await route.fallback()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "profile": self.profile.name if self.profile else None,
+            "blocked": self.blocked,
+            "stubbed": self.stubbed,
+            "delayed": self.delayed,
+            "estimatedSavedMs": int(self.saved_ms),
+        }
+
+
+_pages: Dict[Any, PageRouting] = {}
+
+
+def active_routing(page) -> Optional[PageRouting]:
+    """Routing state of a page if a profile is currently applied to it."""
+    state = _pages.get(page)
+    return state if state and state.profile else None
+
+
+def routing_for(page) -> PageRouting:
+    state = _pages.get(page)
+    if state is None:
+        state = _pages[page] = PageRouting(page)
+        page.once("close", lambda _: _pages.pop(page, None))
+    return state
+
+
+def stats_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Counters accumulated between two stats() snapshots."""
+    return {
+        "profile": after["profile"],
+        **{k: after[k] - before[k] for k in ("blocked", "stubbed", "delayed", "estimatedSavedMs")},
+    }
+
+
+class ProfileScope:
+    """Apply a profile for the duration of a block, then restore the page's previous one."""
+
+    def __init__(self, page, profile: Union[str, Dict[str, Any], None]):
+        self.state = routing_for(page)
+        self.profile = resolve_profile(profile)
+        self.report: Dict[str, Any] = {}
+
+    async def __aenter__(self):
+        self._previous = self.state.profile
+        self._before = self.state.stats()
+        await self.state.set_profile(self.profile)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.report.update(stats_delta(self._before, self.state.stats()))
+        await self.state.set_profile(self._previous)
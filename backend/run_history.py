@@ -0,0 +1,294 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("uvicorn.error")
+
+# Append-only SQLite store of every script run and its step results
+HISTORY_DB = Path(os.environ.get("PLAYTEST_RUN_HISTORY", str(Path(__file__).parent / "run_history.db")))
+# Runs written per transaction, and the longest a run waits in memory before it is written
+WRITE_BATCH = 200
+FLUSH_INTERVAL = 0.5
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    script TEXT NOT NULL,
+    source TEXT NOT NULL,
+    started REAL NOT NULL,
+    total_ms INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_script_started ON runs (script, started);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    step TEXT NOT NULL,
+    action TEXT,
+    started REAL NOT NULL,
+    elapsed_ms INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error_class TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS steps_run ON steps (run_id);
+-- Rollups maintained on insert, so trend and ranking queries never scan the step table
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    script TEXT NOT NULL,
+    day TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    failed_runs INTEGER NOT NULL,
+    total_ms INTEGER NOT NULL,
+    max_ms INTEGER NOT NULL,
+    PRIMARY KEY (script, day)
+);
+CREATE TABLE IF NOT EXISTS step_rollup (
+    script TEXT NOT NULL,
+    step TEXT NOT NULL,
+    action TEXT,
+    runs INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    retried INTEGER NOT NULL,
+    flips INTEGER NOT NULL,
+    last_status TEXT NOT NULL,
+    total_ms INTEGER NOT NULL,
+    max_ms INTEGER NOT NULL,
+    PRIMARY KEY (script, step)
+);
+"""
+
+DAILY_UPSERT = """
+INSERT INTO daily_rollup (script, day, runs, failed_runs, total_ms, max_ms) VALUES (?, ?, 1, ?, ?, ?)
+ON CONFLICT (script, day) DO UPDATE SET
+    runs = runs + 1,
+    failed_runs = failed_runs + excluded.failed_runs,
+    total_ms = total_ms + excluded.total_ms,
+    max_ms = MAX(max_ms, excluded.max_ms)
+"""
+
+# A flip is a status change against the step's previous run: the signature of a flaky step
+STEP_UPSERT = """
+INSERT INTO step_rollup (script, step, action, runs, errors, retried, flips, last_status, total_ms, max_ms)
+VALUES (?, ?, ?, 1, ?, ?, 0, ?, ?, ?)
+ON CONFLICT (script, step) DO UPDATE SET
+    action = excluded.action,
+    runs = runs + 1,
+    errors = errors + excluded.errors,
+    retried = retried + excluded.retried,
+    flips = flips + (last_status != excluded.last_status),
+    last_status = excluded.last_status,
+    total_ms = total_ms + excluded.total_ms,
+    max_ms = MAX(max_ms, excluded.max_ms)
+"""
+
+
+def _step_key(step: Dict[str, Any]) -> str:
+    # Same identity as the flake statistics: the step name, else its index
+    return str(step.get("name") or step["index"])
+
+
+class RunHistory:
+    """
+    Runs are queued by `record()` (cheap, safe to call from the event loop) and
+    written in batches by a background thread. Queries open their own
+    connection; call them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: Path = HISTORY_DB):
+        self.path = path
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def record(
+        self,
+        script: str,
+        steps: List[Dict[str, Any]],
+        ok: bool,
+        total_ms: int,
+        started: Optional[float] = None,
+        source: str = "runScript",
+    ):
+        """
+        Queue one run. `steps` are step results as produced by run_steps
+        (index, name, action, status, error.name, details.elapsedMs/attempts),
+        optionally with "at", the step's start as a Unix timestamp.
+        """
+        started = time.time() - total_ms / 1000 if started is None else started
+        self._queue.put({
+            "script": script, "steps": steps, "ok": ok, "total_ms": total_ms, "started": started, "source": source,
+        })
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="run-history-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            # Runs stay queued; the next record() tries again with a new writer
+            logger.warning(f"Could not open run history {self.path}: {e}")
+            with self._lock:
+                self._writer = None
+            return
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=30)]
+                except queue.Empty:
+                    # Idle: let the thread end; the next record() starts a new one. Decided under
+                    # the lock record() checks, so a run queued meanwhile is never left behind
+                    with self._lock:
+                        if self._queue.empty():
+                            self._writer = None
+                            return
+                    continue
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while len(batch) < WRITE_BATCH:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                try:
+                    with conn:
+                        for run in batch:
+                            self._insert(conn, run)
+                except Exception as e:
+                    logger.warning(f"Could not write {len(batch)} run(s) to {self.path}: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, run: Dict[str, Any]):
+        failed = sum(1 for s in run["steps"] if s.get("status") != "ok")
+        cur = conn.execute(
+            "INSERT INTO runs (script, source, started, total_ms, ok, failed) VALUES (?, ?, ?, ?, ?, ?)",
+            (run["script"], run["source"], run["started"], run["total_ms"], int(run["ok"]), failed),
+        )
+        run_id = cur.lastrowid
+        rows = []
+        # Without a recorded start time, steps are assumed to run back to back
+        at = run["started"]
+        for step in run["steps"]:
+            details = step.get("details") or {}
+            elapsed = int(details.get("elapsedMs") or step.get("elapsedMs") or 0)
+            status = "ok" if step.get("status") == "ok" else "error"
+            error = step.get("error")
+            error_class = None if status == "ok" else (error.get("name") if isinstance(error, dict) else step.get("errorName"))
+            attempts = int(details.get("attempts") or 1)
+            at = step.get("at") or at
+            rows.append((run_id, step["index"], _step_key(step), step.get("action"), at, elapsed, status, error_class, attempts))
+            conn.execute(STEP_UPSERT, (
+                run["script"], _step_key(step), step.get("action"),
+                int(status != "ok"), int(attempts > 1), status, elapsed, elapsed,
+            ))
+            at += elapsed / 1000
+        conn.executemany(
+            "INSERT INTO steps (run_id, idx, step, action, started, elapsed_ms, status, error_class, attempts)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        day = time.strftime("%Y-%m-%d", time.localtime(run["started"]))
+        conn.execute(DAILY_UPSERT, (run["script"], day, int(not run["ok"]), run["total_ms"], run["total_ms"]))
+
+    def flush(self, timeout: float = 10):
+        """Wait until queued runs are written (CLI exit, tests)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    # Queries (blocking)
+
+    def _query(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def runs(self, script: str, limit: int = 50, before: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Most recent runs of a script, newest first (uses the script/started index)."""
+        where, params = ("AND started < ?", (before,)) if before is not None else ("", ())
+        return self._query(
+            "SELECT id, source, started, total_ms AS totalMs, ok, failed FROM runs"
+            f" WHERE script = ? {where} ORDER BY started DESC LIMIT ?",
+            (script, *params, limit),
+        )
+
+    def run_steps(self, run_id: int, script: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Steps of one run; empty if the run does not exist or belongs to another script."""
+        where, params = (" AND r.script = ?", (script,)) if script else ("", ())
+        return self._query(
+            "SELECT s.idx AS \"index\", s.step, s.action, s.started, s.elapsed_ms AS elapsedMs, s.status,"
+            " s.error_class AS errorClass, s.attempts"
+            f" FROM steps s JOIN runs r ON r.id = s.run_id WHERE s.run_id = ?{where} ORDER BY s.started, s.idx",
+            (run_id, *params),
+        )
+
+    def trend(self, script: str, days: int = 30) -> List[Dict[str, Any]]:
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+        return self._query(
+            "SELECT day, runs, failed_runs AS failedRuns, total_ms / runs AS avgMs, max_ms AS maxMs"
+            " FROM daily_rollup WHERE script = ? AND day >= ? ORDER BY day",
+            (script, since),
+        )
+
+    def slowest_steps(self, script: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        where, params = ("WHERE script = ?", (script,)) if script else ("", ())
+        return self._query(
+            "SELECT script, step, action, runs, total_ms / runs AS avgMs, max_ms AS maxMs"
+            f" FROM step_rollup {where} ORDER BY total_ms * 1.0 / runs DESC LIMIT ?",
+            (*params, limit),
+        )
+
+    def flaky_steps(self, script: Optional[str] = None, min_runs: int = 5, limit: int = 20) -> List[Dict[str, Any]]:
+        """Steps ranked by how often their outcome changes between runs, then by retries and errors."""
+        where, params = ("AND script = ?", (script,)) if script else ("", ())
+        return self._query(
+            "SELECT script, step, action, runs, errors, retried, flips,"
+            " ROUND(flips * 1.0 / (runs - 1), 3) AS flipRate, ROUND(errors * 1.0 / runs, 3) AS errorRate"
+            f" FROM step_rollup WHERE runs >= ? AND runs > 1 AND (flips > 0 OR retried > 0) {where}"
+            " ORDER BY flipRate DESC, retried DESC, errors DESC LIMIT ?",
+            (min_runs, *params, limit),
+        )
+
+    def last_runs(self) -> Dict[str, Dict[str, Any]]:
+        """Latest run per script, in the shape ScriptStore.record_run keeps."""
+        rows = self._query(
+            "SELECT r.script, r.started, r.ok, r.total_ms, r.failed FROM runs r"
+            " JOIN (SELECT script, MAX(started) AS started FROM runs GROUP BY script) last"
+            " ON r.script = last.script AND r.started = last.started"
+        )
+        return {
+            row["script"]: {"at": row["started"], "ok": bool(row["ok"]), "totalMs": row["total_ms"], "failed": row["failed"]}
+            for row in rows
+        }
+
+
+HISTORY = RunHistory()
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.scripts import SCRIPTS_DIR
+from run_history import HISTORY as RUN_HISTORY
+from step_retry import FLAKE_STATS
+from utils.sharding import balance_shards
+
+HISTORY_FILE = Path(__file__).parent / ".suite_durations.json"
+# Weight of the latest run when updating the historical duration (exponential moving average)
+HISTORY_ALPHA = 0.5
+
+
+def discover_scripts(pattern: Optional[str] = None) -> List[str]:
+    """Names of all saved scripts, optionally filtered by a substring."""
+    names = sorted((p.stem for p in SCRIPTS_DIR.glob("*.json")), key=str.lower)
+    if pattern:
+        names = [n for n in names if pattern.lower() in n.lower()]
+    return names
+
+
+def load_history(path: Path) -> Dict[str, float]:
+    try:
+        return {k: float(v) for k, v in json.loads(path.read_text("utf-8")).items()}
+    except Exception:
+        return {}
+
+
+def save_history(path: Path, history: Dict[str, float], results: List[Dict[str, Any]]):
+    for r in results:
+        if r.get("error"):
+            # Script never ran to completion; its duration says nothing about future runs
+            continue
+        prev = history.get(r["name"])
+        ms = float(r["totalMs"])
+        history[r["name"]] = ms if prev is None else prev + HISTORY_ALPHA * (ms - prev)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(history, indent=2, sort_keys=True), "utf-8")
+    os.replace(tmp, path)
+
+
+async def _run_shard_async(
+    names: List[str],
+    headless: bool,
+    har_mode: Optional[str] = None,
+    har_not_found: str = "abort",
+) -> List[Dict[str, Any]]:
+    # Imported here so each worker process initializes Playwright on its own
+    from playwright.async_api import async_playwright
+    from message_processor import ACTION_HANDLERS
+    from playwright_manager import DEFAULT_VIEWPORT
+    from har_replay import attach_har, har_path
+    from routing_profiles import resolve_profile, routing_for
+    from script_compiler import compile_script
+    from script_runner import run_steps
+    from locator_cache import cache_for
+
+    results = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            for name in names:
+                steps_out = []
+
+                async def on_step(result: Dict[str, Any]):
+                    steps_out.append({
+                        "index": result["index"],
+                        **({"name": result["name"]} if result.get("name") else {}),
+                        "action": result["action"],
+                        "status": result["status"],
+                        "elapsedMs": result["details"].get("elapsedMs"),
+                        **({"error": result["error"]["message"], "errorName": result["error"].get("name")} if "error" in result else {}),
+                    })
+
+                started = time.monotonic()
+                routing = cache = None
+                context = await browser.new_context(viewport=DEFAULT_VIEWPORT)
+                try:
+                    if har_mode:
+                        # A recorded HAR is written when the context closes below
+                        await attach_har(context, har_path(name), har_mode, har_not_found)
+                    page = await context.new_page()
+                    cache = cache_for(page)
+                    plan = compile_script(name, ACTION_HANDLERS)
+                    if plan.routing is not None:
+                        routing = routing_for(page)
+                        await routing.set_profile(resolve_profile(plan.routing))
+                    summary = await run_steps(page, plan, ACTION_HANDLERS, on_step=on_step)
+                    ok, error = summary["failed"] == 0, None
+                except Exception as e:
+                    ok, error = False, f"{e.__class__.__name__}: {e}"
+                finally:
+                    await context.close()
+                results.append({
+                    "name": name,
+                    "ok": ok,
+                    "totalMs": int((time.monotonic() - started) * 1000),
+                    "steps": steps_out,
+                    **({"routing": routing.stats()} if routing else {}),
+                    **({"locatorCache": cache.stats()} if cache else {}),
+                    **({"error": error} if error else {}),
+                })
+        finally:
+            await browser.close()
+    return results
+
+
+def _run_shard(
+    names: List[str], headless: bool, har_mode: Optional[str], har_not_found: str
+) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    # Workers record flake counters but leave the file to the parent, which merges all shards and saves once
+    FLAKE_STATS.persist = False
+    results = asyncio.run(_run_shard_async(names, headless, har_mode, har_not_found))
+    return results, FLAKE_STATS.take_delta()
+
+
+def _parse_shard(value: str):
+    try:
+        index, total = (int(x) for x in value.split("/"))
+        if not 1 <= index <= total:
+            raise ValueError
+        return index, total
+    except ValueError:
+        raise argparse.ArgumentTypeError("--shard must look like 2/4")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run saved scripts headless across a process pool.")
+    parser.add_argument("-k", "--filter", help="Only run scripts whose name contains this substring")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--shard", type=_parse_shard, help="Run only shard i of n (e.g. 2/4), for splitting across machines")
+    parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    parser.add_argument("--history", type=Path, default=HISTORY_FILE, help="Historical duration file used for balancing")
+    parser.add_argument("--har", choices=["record", "replay"], help="Record a HAR per script, or serve all requests from it")
+    parser.add_argument("--har-not-found", choices=["abort", "fallback"], default="abort", help="Replay: requests missing from the HAR")
+    parser.add_argument("--json", dest="json_out", type=Path, help="Write the full report as JSON to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print per-step timings")
+    args = parser.parse_args(argv)
+
+    names = discover_scripts(args.filter)
+    history = load_history(args.history)
+    if args.shard:
+        index, total = args.shard
+        names = balance_shards(names, history, total)[index - 1]
+    if not names:
+        print("No scripts to run.")
+        return 0
+
+    # No idle worker processes for surplus shards
+    shards = [shard for shard in balance_shards(names, history, args.workers) if shard]
+    print(f"Running {len(names)} script(s) on {len(shards)} worker(s)...")
+
+    started = time.monotonic()
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = {pool.submit(_run_shard, shard, not args.headed, args.har, args.har_not_found): shard for shard in shards}
+        for fut in as_completed(futures):
+            try:
+                shard_results, flakes = fut.result()
+                FLAKE_STATS.merge(flakes)
+            except Exception as e:
+                # The worker itself failed (e.g. browser launch); count its whole shard as failed
+                error = f"{e.__class__.__name__}: {str(e).splitlines()[0]}"
+                shard_results = [{"name": n, "ok": False, "totalMs": 0, "steps": [], "error": error} for n in futures[fut]]
+            for r in shard_results:
+                results.append(r)
+                mark = "✅ PASS" if r["ok"] else "❌ FAIL"
+                print(f"{mark} {r['name']} ({r['totalMs']} ms)")
+                if r.get("error"):
+                    print(f"    {r['error']}")
+                for s in r["steps"]:
+                    if args.verbose or s["status"] != "ok":
+                        line = f"    #{s['index']:>3} {s['action']:<20} {s['status']:<5} {s['elapsedMs']} ms"
+                        print(line + (f"  {s['error']}" if s.get("error") else ""))
+    wall_ms = int((time.monotonic() - started) * 1000)
+
+    failed = [r for r in results if not r["ok"]]
+    print(f"\n{len(results) - len(failed)} passed, {len(failed)} failed in {wall_ms / 1000:.1f}s wall-clock")
+
+    save_history(args.history, history, results)
+    FLAKE_STATS.save()
+    for r in results:
+        # Scripts that could not be run at all (worker or compile failure) have no step results to keep
+        if r["steps"]:
+            RUN_HISTORY.record(r["name"], r["steps"], r["ok"], r["totalMs"], source="suite")
+    RUN_HISTORY.flush()
+    if args.json_out:
+        args.json_out.write_text(json.dumps({
+            "wallMs": wall_ms,
+            "passed": len(results) - len(failed),
+            "failed": len(failed),
+            "results": results,
+        }, indent=2), "utf-8")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
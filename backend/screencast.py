@@ -0,0 +1,188 @@
+from utils.frames import encode_binary_frame
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import base64
+import logging
+import time
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_MAX_FPS = 10
+
+SendBytes = Callable[[bytes], Awaitable[None]]
+
+
+class _Viewer:
+    """
+    One subscribed connection. Holds at most one undelivered frame: a newer frame
+    replaces an older one that was not sent yet, so a slow viewer skips frames
+    instead of building a backlog or holding up the page.
+    """
+
+    def __init__(self, send_bytes: SendBytes, max_fps: float, on_gone: Optional[Callable[["_Viewer"], None]] = None):
+        self._send_bytes = send_bytes
+        self._on_gone = on_gone
+        self._min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._last_accepted = 0.0
+        self._pending: Optional[bytes] = None
+        self._ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self._task = asyncio.create_task(self._writer())
+
+    def offer(self, frame: bytes):
+        now = time.monotonic()
+        if now - self._last_accepted < self._min_interval:
+            self.dropped += 1
+            return
+        self._last_accepted = now
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = frame
+        self._ready.set()
+
+    async def _writer(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            frame, self._pending = self._pending, None
+            if frame is None:
+                continue
+            try:
+                # send_bytes returns False once the connection is gone
+                delivered = await self._send_bytes(frame) is not False
+            except Exception:
+                delivered = False
+            if not delivered:
+                logger.warning("Screencast viewer went away; stopping its stream")
+                if self._on_gone:
+                    self._on_gone(self)
+                return
+            self.sent += 1
+
+    def close(self):
+        self._task.cancel()
+
+
+class Screencast:
+    """A CDP screencast of one page, fanned out to every subscribed connection."""
+
+    def __init__(self, page):
+        self.page = page
+        self.viewers: Dict[Any, _Viewer] = {}
+        self._cdp = None
+        self._seq = 0
+        self.params: Dict[str, Any] = {}
+
+    async def start(self, params: Dict[str, Any]):
+        self.params = params
+        cdp = await self.page.context.new_cdp_session(self.page)
+        try:
+            cdp.on("Page.screencastFrame", self._on_frame)
+            await cdp.send("Page.startScreencast", params)
+        except BaseException:
+            # Not streaming: do not leave the CDP session attached to the page
+            try:
+                await cdp.detach()
+            except Exception:
+                pass
+            raise
+        self._cdp = cdp
+
+    def _on_frame(self, event: Dict[str, Any]):
+        # Ack right away so Chromium keeps producing frames; pacing happens per viewer
+        asyncio.create_task(self._ack(event["sessionId"]))
+        self._seq += 1
+        metadata = event.get("metadata") or {}
+        header = {
+            "type": "screencastFrame",
+            "seq": self._seq,
+            "mime": f"image/{self.params.get('format', 'jpeg')}",
+            "timestamp": metadata.get("timestamp"),
+            "width": metadata.get("deviceWidth"),
+            "height": metadata.get("deviceHeight"),
+        }
+        # Decoded and framed once, shared by all viewers
+        frame = encode_binary_frame(header, base64.b64decode(event["data"]))
+        for viewer in list(self.viewers.values()):
+            viewer.offer(frame)
+
+    async def _ack(self, session_id: int):
+        try:
+            await self._cdp.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception:
+            pass
+
+    async def stop(self):
+        for viewer in self.viewers.values():
+            viewer.close()
+        self.viewers.clear()
+        if self._cdp:
+            try:
+                await self._cdp.send("Page.stopScreencast")
+                await self._cdp.detach()
+            except Exception:
+                pass
+            self._cdp = None
+
+
+# Active screencasts by page
+_screencasts: Dict[Any, Screencast] = {}
+
+
+async def subscribe(page, key: Any, send_bytes: SendBytes, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Start streaming `page` to the connection identified by `key`."""
+    cast = _screencasts.get(page)
+    if cast is None:
+        params = {
+            "format": options.get("format", "jpeg"),
+            "quality": int(options.get("quality", 60)),
+            "everyNthFrame": int(options.get("everyNthFrame", 1)),
+        }
+        for k in ("maxWidth", "maxHeight"):
+            if options.get(k):
+                params[k] = int(options[k])
+        cast = Screencast(page)
+        await cast.start(params)
+        _screencasts[page] = cast
+    old = cast.viewers.pop(key, None)
+    if old:
+        old.close()
+    max_fps = float(options.get("maxFps", DEFAULT_MAX_FPS))
+
+    def on_gone(viewer: _Viewer):
+        # Send failed: the connection is gone, so stop encoding frames for it
+        task = asyncio.create_task(_viewer_gone(page, key, viewer))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    cast.viewers[key] = _Viewer(send_bytes, max_fps, on_gone)
+    return {"streaming": True, "viewers": len(cast.viewers), "maxFps": max_fps, **cast.params}
+
+
+async def _viewer_gone(page, key: Any, viewer: _Viewer):
+    cast = _screencasts.get(page)
+    # The connection may have re-subscribed meanwhile; only remove this viewer
+    if cast and cast.viewers.get(key) is viewer:
+        await unsubscribe(page, key)
+
+
+async def unsubscribe(page, key: Any) -> Dict[str, Any]:
+    """Stop streaming to one connection; the CDP screencast stops with its last viewer."""
+    cast = _screencasts.get(page)
+    viewer = cast.viewers.pop(key, None) if cast else None
+    if viewer:
+        viewer.close()
+    if cast and not cast.viewers:
+        _screencasts.pop(page, None)
+        await cast.stop()
+    return {
+        "streaming": False,
+        "sent": viewer.sent if viewer else 0,
+        "dropped": viewer.dropped if viewer else 0,
+    }
+
+
+async def unsubscribe_all(key: Any):
+    """Remove a closed connection from every screencast."""
+    for page in [p for p, cast in _screencasts.items() if key in cast.viewers]:
+        await unsubscribe(page, key)
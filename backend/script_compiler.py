@@ -0,0 +1,250 @@
+from api.scripts import SCRIPTS_DIR
+from utils.sanitize_name import _sanitize_name
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import re
+
+Handler = Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# Number of compiled plans kept in memory
+PLAN_CACHE_SIZE = 128
+
+# Fields forwarded to the action handler
+STEP_FIELDS = ("action", "target", "value", "options")
+
+SELECTOR_ACTIONS = {
+    "waitForSelector", "waitForVisible", "waitForHidden",
+    "click", "dblclick", "hover", "fill", "type", "press", "selectOption",
+    "expectExists", "expectNotExists", "expectVisible", "expectTextContains",
+    "getText", "getAttribute", "getValue",
+}
+
+# action -> option keys that may stand in for 'value' (empty tuple: 'value' itself is required)
+VALUE_ACTIONS = {
+    "goto": ("url",),
+    "waitTimeout": ("ms",),
+    "clickPosition": (),
+    "fill": (),
+    "type": (),
+    "press": ("key",),
+    "selectOption": ("value",),
+    "expectTextContains": (),
+    "expectUrlMatches": ("pattern",),
+    "expectTitle": (),
+    "getAttribute": ("name",),
+    "setDefaultTimeout": ("timeout",),
+    "evalJs": (),
+    "runScript": ("name", "steps"),
+    "setRouting": ("profile",),
+}
+
+
+class CompileError(ValueError):
+    """A step is invalid; raised before any step of the script runs."""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(f"step {index + 1}: {message}")
+        self.index = index
+
+
+@lru_cache(maxsize=256)
+def compile_regex(pattern: str, flags: int = 0) -> "re.Pattern":
+    """re.compile with a cache shared by the compiler and the action handlers."""
+    return re.compile(pattern, flags)
+
+
+def _has_slots(value: Any) -> bool:
+    if isinstance(value, str):
+        return "${" in value
+    if isinstance(value, list):
+        return any(_has_slots(v) for v in value)
+    if isinstance(value, dict):
+        return any(_has_slots(v) for v in value.values())
+    return False
+
+
+class CompiledStep:
+    """A validated step with its handler resolved and interpolation slots located."""
+
+    __slots__ = (
+        "index", "action", "handler", "message", "dynamic", "store_as", "name", "ui_id", "raw",
+        "retries", "retry_delay_ms", "next_on_ok", "next_on_error",
+    )
+
+    def __init__(self, index: int, step: Dict[str, Any], handler: Handler):
+        self.index = index
+        self.action = step.get("action")
+        self.handler = handler
+        self.raw = step
+        self.store_as = step.get("storeAs") or None
+        self.name = step.get("name")
+        self.ui_id = step.get("uiId")
+        self.retries = _int_field(index, step, "retries") or 0
+        self.retry_delay_ms = _int_field(index, step, "retryDelayMs")
+        # Plan positions to continue at (None: the next step); resolved by compile_steps
+        self.next_on_ok: Optional[int] = None
+        self.next_on_error: Optional[int] = None
+        self.message = _normalize({k: step[k] for k in STEP_FIELDS if step.get(k) is not None})
+        # Only fields containing ${var} are interpolated at run time
+        self.dynamic = tuple(k for k in STEP_FIELDS[1:] if _has_slots(self.message.get(k)))
+
+
+class ScriptPlan:
+    """Executable form of a script: enabled steps in order, already validated."""
+
+    def __init__(self, name: Optional[str], steps: List[CompiledStep], total: int, routing: Any = None):
+        self.name = name
+        self.steps = steps
+        self.total = total
+        # Routing profile saved with the script (name or inline spec)
+        self.routing = routing
+
+    @property
+    def skipped(self) -> int:
+        return self.total - len(self.steps)
+
+
+def _int_field(index: int, step: Dict[str, Any], key: str) -> Optional[int]:
+    value = step.get(key)
+    if value is None or value == "":
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise CompileError(index, f"'{key}' must be a whole number")
+    if value < 0:
+        raise CompileError(index, f"'{key}' must not be negative")
+    return value
+
+
+def _resolve_jump(index: int, key: str, target: Any, steps: List[CompiledStep], raw: List[Any]) -> Optional[int]:
+    """Plan position of a jump target: a step name, a step index or "end"."""
+    if target is None or target == "":
+        return None
+    if target == "end":
+        return len(steps)
+    for pos, step in enumerate(steps):
+        if step.name is not None and step.name == target:
+            return pos
+    if isinstance(target, int) or (isinstance(target, str) and target.isdigit()):
+        target_index = int(target)
+        if 0 <= target_index < len(raw):
+            # A disabled target continues at the next enabled step
+            return next((pos for pos, step in enumerate(steps) if step.index >= target_index), len(steps))
+    raise CompileError(index, f"'{key}' target not found: {target!r}")
+
+
+def _normalize(message: Dict[str, Any]) -> Dict[str, Any]:
+    target = message.get("target")
+    if isinstance(target, str):
+        message["target"] = {"selector": target.strip()}
+    elif isinstance(target, dict) and isinstance(target.get("selector"), str):
+        message["target"] = {**target, "selector": target["selector"].strip()}
+    options = message.get("options")
+    if isinstance(options, dict) and isinstance(options.get("timeout"), str) and options["timeout"].isdigit():
+        message["options"] = {**options, "timeout": int(options["timeout"])}
+    return message
+
+
+def _validate(index: int, message: Dict[str, Any]):
+    action = message.get("action")
+    options = message.get("options") or {}
+    if options and not isinstance(options, dict):
+        raise CompileError(index, f"{action}: 'options' must be an object")
+
+    if action in SELECTOR_ACTIONS and not (message.get("target") or {}).get("selector"):
+        raise CompileError(index, f"{action}: 'target.selector' is required")
+    if action in VALUE_ACTIONS and message.get("value") is None and not any(
+        options.get(k) is not None for k in VALUE_ACTIONS[action]
+    ):
+        raise CompileError(index, f"{action}: 'value' is required")
+    if action == "setViewport" and not (options.get("width") and options.get("height")):
+        raise CompileError(index, "setViewport: options.width and options.height are required")
+    if action == "switchFrame" and not (options.get("name") or options.get("url")):
+        raise CompileError(index, "switchFrame: options.name or options.url is required")
+    timeout = options.get("timeout")
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))) and not _has_slots(timeout):
+        raise CompileError(index, f"{action}: options.timeout must be a number of ms")
+
+    # Pre-compile static regexes so a bad pattern fails now and later lookups hit the cache
+    patterns = []
+    if action == "expectUrlMatches":
+        flags = re.IGNORECASE if options.get("ignoreCase") else 0
+        patterns.append((message.get("value") or options.get("pattern"), flags))
+    elif action == "expectTitle" and options.get("mode") == "regex":
+        patterns.append((message.get("value"), 0))
+    elif action == "switchFrame" and options.get("url"):
+        patterns.append((options["url"], 0))
+    for pattern, flags in patterns:
+        if isinstance(pattern, str) and not _has_slots(pattern):
+            try:
+                compile_regex(pattern, flags)
+            except re.error as e:
+                raise CompileError(index, f"{action}: invalid pattern '{pattern}': {e}")
+
+
+def compile_steps(
+    steps: List[Any],
+    handlers: Dict[str, Handler],
+    name: Optional[str] = None,
+    routing: Any = None,
+) -> ScriptPlan:
+    """Validate steps and build a plan; raises CompileError on the first invalid step."""
+    if not isinstance(steps, list):
+        raise CompileError(0, "steps must be a list")
+    compiled = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict) or step.get("enabled") is False:
+            continue
+        action = step.get("action")
+        handler = handlers.get(action)
+        if not handler:
+            raise CompileError(index, f"Unknown action: {action}")
+        cstep = CompiledStep(index, step, handler)
+        _validate(index, cstep.message)
+        compiled.append(cstep)
+    for cstep in compiled:
+        cstep.next_on_ok = _resolve_jump(cstep.index, "nextOnOk", cstep.raw.get("nextOnOk"), compiled, steps)
+        cstep.next_on_error = _resolve_jump(cstep.index, "nextOnError", cstep.raw.get("nextOnError"), compiled, steps)
+    return ScriptPlan(name, compiled, len(steps), routing)
+
+
+_plans: "OrderedDict[Tuple, ScriptPlan]" = OrderedDict()
+
+
+def _cached(key: Tuple, build: Callable[[], ScriptPlan]) -> ScriptPlan:
+    plan = _plans.get(key)
+    if plan is not None:
+        _plans.move_to_end(key)
+        return plan
+    plan = build()
+    _plans[key] = plan
+    if len(_plans) > PLAN_CACHE_SIZE:
+        _plans.popitem(last=False)
+    return plan
+
+
+def compile_script(name: str, handlers: Dict[str, Handler]) -> ScriptPlan:
+    """Compiled plan of a saved script, cached until the file changes (mtime/size)."""
+    safe = _sanitize_name(name)
+    fp = SCRIPTS_DIR / f"{safe}.json"
+    try:
+        st = fp.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Script not found: {safe}")
+    key = ("file", safe, st.st_mtime_ns, st.st_size, id(handlers))
+
+    def build():
+        data = json.loads(fp.read_text("utf-8"))
+        return compile_steps(data.get("steps") or [], handlers, safe, data.get("routing"))
+
+    return _cached(key, build)
+
+
+def compile_inline(steps: List[Any], handlers: Dict[str, Handler]) -> ScriptPlan:
+    """Compiled plan of an inline step list, cached by content hash."""
+    digest = hashlib.sha1(json.dumps(steps, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return _cached(("inline", digest, id(handlers)), lambda: compile_steps(steps, handlers))
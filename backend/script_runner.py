@@ -0,0 +1,157 @@
+from step_timing import run_timed
+from script_compiler import CompiledStep, ScriptPlan, compile_inline
+from step_retry import FLAKE_STATS, run_with_retries
+from metrics import ACTION_DURATION, ACTION_ERRORS
+import asyncio
+import logging
+import re
+import time
+import traceback
+from typing import Any, Dict, Callable, Awaitable, List, Optional, Union
+
+logger = logging.getLogger("uvicorn.error")
+
+VAR_PATTERN = re.compile(r"\$\{([^}]+)\}")
+# Upper bound on executed steps per run, so a nextOnOk/nextOnError cycle cannot run forever
+MAX_STEPS = 10000
+
+StepCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def interpolate(value: Any, variables: Dict[str, Any]) -> Any:
+    """Replace ${var} placeholders, mirroring content.js `interpolate`."""
+    if isinstance(value, str):
+        def _sub(m):
+            v = variables.get(m.group(1).strip())
+            return "" if v is None else str(v)
+        return VAR_PATTERN.sub(_sub, value)
+    if isinstance(value, list):
+        return [interpolate(v, variables) for v in value]
+    if isinstance(value, dict):
+        return {k: interpolate(v, variables) for k, v in value.items()}
+    return value
+
+
+def _stored_value(details: Dict[str, Any]) -> Any:
+    # Same precedence as content.js execOne: value, then url, then the whole details
+    if "value" in details:
+        return details["value"]
+    if "url" in details:
+        return details["url"]
+    return details
+
+
+def _step_message(step: CompiledStep, variables: Dict[str, Any]) -> Dict[str, Any]:
+    # Static fields are shared with the plan; only the precomputed slots are interpolated
+    message = dict(step.message)
+    for k in step.dynamic:
+        message[k] = interpolate(message[k], variables)
+    return message
+
+
+async def run_steps(
+    page,
+    steps: Union[List[Any], ScriptPlan],
+    handlers: Dict[str, Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, Any]]]],
+    variables: Optional[Dict[str, Any]] = None,
+    on_step: Optional[StepCallback] = None,
+    stop_on_error: bool = True,
+    profile: bool = False,
+    include_stack: bool = True,
+    record_flakes: bool = True,
+) -> Dict[str, Any]:
+    """
+    Execute steps sequentially against `page` using the given action handlers.
+    Each step result is passed to `on_step` as soon as it is available.
+
+    `steps` is either a compiled plan or a raw step list, which is compiled (and
+    cached) first; an invalid step raises CompileError before anything runs.
+
+    A step failing with a transient error (timeout, detached element) is retried
+    up to its `retries` with jittered exponential backoff from `retryDelayMs`.
+    After a step, `nextOnOk`/`nextOnError` (step name, index or "end") choose
+    where to continue; an error with a `nextOnError` branch does not stop the run.
+    """
+    plan = steps if isinstance(steps, ScriptPlan) else compile_inline(steps, handlers)
+    variables = variables if variables is not None else {}
+    passed = failed = handled = retried = executed = 0
+    started = time.monotonic()
+    pos = 0
+
+    while pos < len(plan.steps):
+        executed += 1
+        if executed > MAX_STEPS:
+            raise RuntimeError(f"More than {MAX_STEPS} steps executed; check nextOnOk/nextOnError for a cycle")
+        step = plan.steps[pos]
+        action = step.action
+        result: Dict[str, Any] = {"index": step.index, "action": action}
+        if step.name:
+            result["name"] = step.name
+        if step.ui_id:
+            result["uiId"] = step.ui_id
+
+        async def attempt(message: Dict[str, Any]):
+            return await run_timed(page, message, step.handler, profile)
+
+        # Flake statistics are kept for saved scripts only; inline step lists have no stable identity
+        stats_key = f"{plan.name}#{step.name or step.index}" if plan.name and record_flakes else None
+        step_started = time.monotonic()
+        try:
+            (details, timing), attempts = await run_with_retries(
+                attempt, _step_message(step, variables), step.retries, step.retry_delay_ms, stats_key
+            )
+            if step.store_as:
+                variables[step.store_as] = _stored_value(details)
+            result["status"] = "ok"
+            result["details"] = {**details, "elapsedMs": int((time.monotonic() - step_started) * 1000), "timing": timing}
+            passed += 1
+            # Per action like single commands (runScript itself is observed once for the whole run)
+            ACTION_DURATION.observe(time.monotonic() - step_started, action)
+        except Exception as e:
+            ACTION_DURATION.observe(time.monotonic() - step_started, action)
+            ACTION_ERRORS.inc(action, e.__class__.__name__)
+            attempts = getattr(e, "attempts", 1)
+            result["status"] = "error"
+            result["error"] = {
+                "name": e.__class__.__name__,
+                "message": f"{action or '<none>'}: {str(e)}",
+            }
+            if include_stack:
+                result["error"]["stack"] = traceback.format_exc()
+            result["details"] = {"elapsedMs": int((time.monotonic() - step_started) * 1000)}
+            if getattr(e, "timing", None):
+                result["details"]["timing"] = e.timing
+            # An error with a nextOnError branch is an expected outcome, not a failure of the run
+            if step.next_on_error is not None:
+                handled += 1
+            else:
+                failed += 1
+        if attempts > 1:
+            result["details"]["attempts"] = attempts
+            retried += 1
+
+        if on_step:
+            await on_step(result)
+        if result["status"] == "ok":
+            target = step.next_on_ok
+        elif step.next_on_error is not None:
+            target = step.next_on_error
+        elif stop_on_error:
+            break
+        else:
+            target = None
+        pos = pos + 1 if target is None else target
+
+    if plan.name and record_flakes:
+        await asyncio.to_thread(FLAKE_STATS.save)
+    return {
+        "total": plan.total,
+        "passed": passed,
+        "failed": failed,
+        "skipped": plan.skipped,
+        "handled": handled,
+        "retried": retried,
+        "executed": executed,
+        "vars": variables,
+        "totalMs": int((time.monotonic() - started) * 1000),
+    }
@@ -0,0 +1,250 @@
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("uvicorn.error")
+
+# Unchanged directory: files are re-stat'ed at most this often (catches in-place edits)
+RESCAN_INTERVAL = float(os.environ.get("PLAYTEST_SCRIPT_INDEX_TTL", "5"))
+
+
+def atomic_write_text(path: Path, text: str):
+    """Write via a temp file in the same directory and rename it over `path`."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _delta(src: List[str], dst: List[str]) -> List[list]:
+    """Edits turning `src` lines into `dst` lines: [[i1, i2, replacement], ...]."""
+    return [
+        [i1, i2, dst[j1:j2]]
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, src, dst, autojunk=False).get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def _apply_delta(lines: List[str], delta: List[list]) -> List[str]:
+    # Apply back to front so earlier indexes stay valid
+    out = list(lines)
+    for i1, i2, replacement in reversed(delta):
+        out[i1:i2] = replacement
+    return out
+
+
+class ScriptEntry:
+    """Index entry of one saved script; `data` is the parsed JSON file."""
+
+    __slots__ = ("name", "mtime_ns", "size", "data", "steps", "actions", "tags", "etag", "last_run")
+
+    def __init__(self, name: str, mtime_ns: int, size: int, data: Dict[str, Any]):
+        self.name = name
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        steps = data.get("steps") or []
+        self.steps = len(steps)
+        self.actions = {s.get("action") for s in steps if isinstance(s, dict) and s.get("action")}
+        self.tags = [t for t in (data.get("tags") or []) if isinstance(t, str)]
+        self.etag = f'"{mtime_ns:x}-{size:x}"'
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def summary(self) -> Dict[str, Any]:
+        item = {"name": self.name, "mtime": self.mtime_ns / 1e9, "steps": self.steps, "tags": self.tags}
+        if self.last_run:
+            item["lastRun"] = self.last_run
+        return item
+
+
+class ScriptStore:
+    """
+    In-memory index of the *.json scripts in a directory.
+
+    The index is refreshed lazily: a changed directory mtime (file added, removed or
+    replaced) triggers a rescan, otherwise files are re-stat'ed at most every
+    RESCAN_INTERVAL seconds. Only files whose mtime or size changed are parsed again.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._entries: Dict[str, ScriptEntry] = {}
+        self._dir_mtime_ns: Optional[int] = None
+        self._scanned_at = 0.0
+        # Bumped on every change; part of the listing ETag
+        self.version = 0
+        # Last-run metadata survives re-parsing of the file
+        self._last_runs: Dict[str, Dict[str, Any]] = {}
+        # Revision logs: one JSON line per save holding the reverse diff to the previous text
+        self.history_dir = directory / ".history"
+        self._write_lock = threading.Lock()
+        # Lookups run in worker threads; one rescan at a time
+        self._scan_lock = threading.Lock()
+
+    def _scan(self):
+        entries = {}
+        changed = False
+        for p in self.directory.glob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            old = self._entries.get(p.stem)
+            if old and old.mtime_ns == st.st_mtime_ns and old.size == st.st_size:
+                entries[p.stem] = old
+                continue
+            try:
+                data = json.loads(p.read_text("utf-8"))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable script {p.name}: {e}")
+                continue
+            entry = ScriptEntry(p.stem, st.st_mtime_ns, st.st_size, data if isinstance(data, dict) else {})
+            entry.last_run = self._last_runs.get(p.stem)
+            entries[p.stem] = entry
+            changed = True
+        if changed or entries.keys() != self._entries.keys():
+            self.version += 1
+        self._entries = entries
+
+    def refresh(self, force: bool = False):
+        """Bring the index up to date (blocking: parses changed files; call through asyncio.to_thread)."""
+        with self._scan_lock:
+            try:
+                dir_mtime = self.directory.stat().st_mtime_ns
+            except OSError:
+                dir_mtime = None
+            now = time.monotonic()
+            if force or dir_mtime != self._dir_mtime_ns or now - self._scanned_at >= RESCAN_INTERVAL:
+                self._scan()
+                self._dir_mtime_ns = dir_mtime
+                self._scanned_at = now
+
+    def invalidate(self):
+        """Force a rescan on the next access (called after saves)."""
+        self._dir_mtime_ns = None
+
+    def get(self, name: str) -> Optional[ScriptEntry]:
+        self.refresh()
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        # A single stat keeps reads exact even between rescans
+        fp = self.directory / f"{name}.json"
+        try:
+            st = fp.stat()
+        except OSError:
+            self.invalidate()
+            return None
+        if st.st_mtime_ns != entry.mtime_ns or st.st_size != entry.size:
+            self.refresh(force=True)
+            entry = self._entries.get(name)
+        return entry
+
+    def query(
+        self,
+        q: Optional[str] = None,
+        tag: Optional[str] = None,
+        action: Optional[str] = None,
+    ) -> List[ScriptEntry]:
+        self.refresh()
+        needle = (q or "").lower()
+        items = [
+            e for e in self._entries.values()
+            if (not needle or needle in e.name.lower())
+            and (not tag or tag in e.tags)
+            and (not action or action in e.actions)
+        ]
+        items.sort(key=lambda e: e.name.lower())
+        return items
+
+    def listing_etag(self, *query: Any) -> str:
+        self.refresh()
+        key = json.dumps([self.version, query], default=str)
+        return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + '"'
+
+    def seed_last_runs(self, runs: Dict[str, Dict[str, Any]]):
+        """Last-run metadata persisted elsewhere (run history), for scripts not run since start-up."""
+        for name, run in runs.items():
+            self._last_runs.setdefault(name, run)
+            entry = self._entries.get(name)
+            if entry is not None and entry.last_run is None:
+                entry.last_run = self._last_runs[name]
+        self.version += 1
+
+    def record_run(self, name: str, ok: bool, total_ms: int, failed: int = 0):
+        """Attach last-run metadata to a script (shown in listings)."""
+        run = {"at": time.time(), "ok": ok, "totalMs": total_ms, "failed": failed}
+        self._last_runs[name] = run
+        entry = self._entries.get(name)
+        if entry is not None:
+            entry.last_run = run
+        self.version += 1
+
+    # Persistence (blocking; call through asyncio.to_thread)
+
+    def _history_path(self, name: str) -> Path:
+        return self.history_dir / f"{name}.jsonl"
+
+    def revisions(self, name: str) -> List[Dict[str, Any]]:
+        """Revision log of a script, oldest first; the last entry is the current file."""
+        fp = self._history_path(name)
+        if not fp.exists():
+            return []
+        return [json.loads(line) for line in fp.read_text("utf-8").splitlines() if line.strip()]
+
+    def write(self, name: str, text: str, steps_hash: str) -> Tuple[bool, bool, int]:
+        """
+        Atomically store a script's JSON text and append a revision.
+
+        Returns (changed, steps_changed, rev). Identical text is not written again;
+        `steps_changed` tells the caller whether derived files need regenerating.
+        """
+        fp = self.directory / f"{name}.json"
+        with self._write_lock:
+            old = fp.read_text("utf-8") if fp.exists() else None
+            history = self.revisions(name)
+            last_hash = history[-1].get("stepsHash") if history else None
+            if old == text:
+                return False, steps_hash != last_hash, len(history)
+            atomic_write_text(fp, text)
+            rev = len(history) + 1
+            record = {
+                "rev": rev,
+                "at": time.time(),
+                "stepsHash": steps_hash,
+                # Reverse delta: turns this revision back into the previous one (None: file was new)
+                "delta": None if old is None else _delta(text.splitlines(True), old.splitlines(True)),
+            }
+            self.history_dir.mkdir(exist_ok=True)
+            with open(self._history_path(name), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.invalidate()
+            return True, steps_hash != last_hash, rev
+
+    def text_at(self, name: str, rev: int) -> str:
+        """Rebuild the JSON text of revision `rev` by walking reverse deltas from the current file."""
+        history = self.revisions(name)
+        if not 1 <= rev <= len(history):
+            raise KeyError(rev)
+        lines = (self.directory / f"{name}.json").read_text("utf-8").splitlines(True)
+        for record in reversed(history[rev:]):
+            if record["delta"] is None:
+                raise KeyError(rev)
+            lines = _apply_delta(lines, record["delta"])
+        return "".join(lines)
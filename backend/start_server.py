@@ -1,14 +1,39 @@
+import argparse
+import os
 import uvicorn
 import logging
 
 logger = logging.getLogger("uvicorn.error")
 
+# Fast-start defaults for production: headless, throw-away profile, no initial navigation,
+# browser pre-warmed in the background while the HTTP server already accepts requests
+PRODUCTION_ENV = {
+    "PLAYTEST_HEADLESS": "1",
+    "PLAYTEST_BROWSER_LAUNCH": "background",
+    "PLAYTEST_PROFILE": "ephemeral",
+    "PLAYTEST_START_URL": "",
+}
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the Playtest FastAPI server.")
+    parser.add_argument("--prod", action="store_true", help="Production mode: headless, no reloader, fast start")
+    parser.add_argument("--lazy", action="store_true", help="Launch the browser on the first command instead of pre-warming")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.prod:
+        # Explicit environment settings still win over the production defaults
+        for key, value in PRODUCTION_ENV.items():
+            os.environ.setdefault(key, value)
+    if args.lazy:
+        os.environ["PLAYTEST_BROWSER_LAUNCH"] = "lazy"
+
     logger.info("Starting FastAPI server with Playwright integration...")
     uvicorn.run(
         "main:app",
-        host="127.0.0.1",
-        port=8000,
-        reload=True, 
+        host=args.host,
+        port=args.port,
+        reload=not args.prod,
         log_level="info"
     )
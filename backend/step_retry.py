@@ -0,0 +1,241 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from script_store import atomic_write_text
+
+logger = logging.getLogger("uvicorn.error")
+
+# Per-step attempt/flake counters, kept across server restarts
+FLAKE_STATS_FILE = Path(os.environ.get("PLAYTEST_FLAKE_STATS", str(Path(__file__).parent / "flake_stats.json")))
+# Backoff: the n-th retry waits a random time in [0, min(cap, base * 2^n)] ("full jitter")
+DEFAULT_RETRY_DELAY_MS = 250
+MAX_RETRY_DELAY_MS = int(os.environ.get("PLAYTEST_RETRY_MAX_DELAY_MS", "5000"))
+# A step counts as flaky once this share of its runs needed a retry (or failed on a transient error)
+FLAKE_THRESHOLD = float(os.environ.get("PLAYTEST_FLAKE_THRESHOLD", "0.1"))
+# Runs observed before a step's timeout is tuned
+MIN_RUNS = 5
+MAX_TUNED_TIMEOUT_MS = int(os.environ.get("PLAYTEST_MAX_TUNED_TIMEOUT_MS", "60000"))
+
+# Default timeouts of the action handlers (see _get_timeout calls in message_processor.py)
+NAVIGATION_ACTIONS = {"goto", "reload", "goBack", "goForward", "waitForNavigation", "waitForNetworkIdle"}
+DEFAULT_TIMEOUT_MS = 10000
+NAVIGATION_TIMEOUT_MS = 30000
+
+# Error texts Playwright uses for conditions that usually clear up on their own
+TRANSIENT_MARKERS = (
+    "element is not attached",
+    "element is detached",
+    "not attached to the dom",
+    "execution context was destroyed",
+    "element is not stable",
+    "intercepts pointer events",
+    "element is outside of the viewport",
+    "frame was detached",
+    "net::err_network_changed",
+    "net::err_connection_reset",
+)
+
+# Actions a timeout may interrupt halfway (text partly typed, a form already submitted):
+# they are only retried on errors raised while Playwright still waited to act
+NON_IDEMPOTENT_ACTIONS = {"click", "dblclick", "clickPosition", "fill", "type", "press", "selectOption", "evalJs"}
+PRE_ACTION_MARKERS = (
+    "element is not attached",
+    "element is detached",
+    "not attached to the dom",
+    "element is not stable",
+    "intercepts pointer events",
+    "element is outside of the viewport",
+)
+# Call-log line Playwright writes once it actually acts
+_ACTED_MARKER = "performing "
+
+
+def is_transient(error: BaseException, action: Optional[str] = None) -> bool:
+    """
+    True for timeouts and detached/unstable elements; assertion and argument
+    errors are final. For NON_IDEMPOTENT_ACTIONS only errors from before the
+    action ran count, whatever the error class.
+    """
+    text = str(error).lower()
+    if action in NON_IDEMPOTENT_ACTIONS:
+        return _ACTED_MARKER not in text and any(marker in text for marker in PRE_ACTION_MARKERS)
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, PlaywrightTimeoutError)):
+        return True
+    if isinstance(error, (ValueError, TypeError, LookupError, AssertionError)):
+        return False
+    return any(marker in text for marker in TRANSIENT_MARKERS)
+
+
+def backoff_delay(retry: int, base_ms: int = DEFAULT_RETRY_DELAY_MS, cap_ms: int = MAX_RETRY_DELAY_MS) -> float:
+    """Seconds to wait before retry number `retry` (0-based)."""
+    return random.uniform(0, min(cap_ms, base_ms * (2 ** retry))) / 1000
+
+
+def default_timeout(action: Optional[str]) -> int:
+    return NAVIGATION_TIMEOUT_MS if action in NAVIGATION_ACTIONS else DEFAULT_TIMEOUT_MS
+
+
+class FlakeStats:
+    """
+    Counters per step key ("<script>#<step name or index>"):
+    runs, retried (passed only after a retry), failed, transient failures and
+    the slowest successful attempt. Loaded lazily, written with `save()`.
+    """
+
+    def __init__(self, path: Path = FLAKE_STATS_FILE):
+        self.path = path
+        self._steps: Optional[Dict[str, Dict[str, Any]]] = None
+        # Counters added since load, for processes that hand them to a parent instead of saving
+        self._delta: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        # False in run_suite.py workers: the parent merges their deltas and saves once
+        self.persist = True
+
+    def _data(self) -> Dict[str, Dict[str, Any]]:
+        if self._steps is None:
+            try:
+                self._steps = json.loads(self.path.read_text("utf-8"))
+            except FileNotFoundError:
+                self._steps = {}
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable flake stats {self.path}: {e}")
+                self._steps = {}
+        return self._steps
+
+    @staticmethod
+    def _entry(steps: Dict[str, Dict[str, Any]], key: str) -> Dict[str, Any]:
+        return steps.setdefault(key, {"runs": 0, "retried": 0, "failed": 0, "transient": 0, "slowestOkMs": 0})
+
+    def record(self, key: str, action: Optional[str], attempts: int, ok: bool, transient: bool, elapsed_ms: int):
+        with self._lock:
+            for entry in (self._entry(self._data(), key), self._entry(self._delta, key)):
+                entry["action"] = action
+                entry["runs"] += 1
+                if ok and attempts > 1:
+                    entry["retried"] += 1
+                if not ok:
+                    entry["failed"] += 1
+                    if transient:
+                        entry["transient"] += 1
+                if ok:
+                    entry["slowestOkMs"] = max(entry["slowestOkMs"], elapsed_ms)
+            self._dirty = True
+
+    def take_delta(self) -> Dict[str, Dict[str, Any]]:
+        """Counters recorded since load or the last call (picklable, for merge() in another process)."""
+        with self._lock:
+            delta, self._delta = self._delta, {}
+            return delta
+
+    def merge(self, delta: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            for key, counts in delta.items():
+                entry = self._entry(self._data(), key)
+                entry["action"] = counts.get("action")
+                for field in ("runs", "retried", "failed", "transient"):
+                    entry[field] += counts.get(field, 0)
+                entry["slowestOkMs"] = max(entry["slowestOkMs"], counts.get("slowestOkMs", 0))
+                self._dirty = True
+
+    def flake_rate(self, key: str) -> float:
+        entry = self._data().get(key)
+        if not entry or not entry["runs"]:
+            return 0.0
+        return (entry["retried"] + entry["transient"]) / entry["runs"]
+
+    def tuned_timeout(self, key: str, action: Optional[str]) -> Optional[int]:
+        """
+        Timeout for a step that flakes often: twice its slowest successful run
+        (at least the handler default), scaled up by the flake rate. None while
+        the step is stable or has too few runs.
+        """
+        entry = self._data().get(key)
+        if not entry or entry["runs"] < MIN_RUNS:
+            return None
+        rate = self.flake_rate(key)
+        if rate < FLAKE_THRESHOLD:
+            return None
+        base = max(default_timeout(action), 2 * entry["slowestOkMs"])
+        return min(MAX_TUNED_TIMEOUT_MS, int(base * (1 + rate)))
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {
+                **entry,
+                "flakeRate": round(self.flake_rate(key), 3),
+                "tunedTimeoutMs": self.tuned_timeout(key, entry.get("action")),
+            }
+            for key, entry in self._data().items()
+            if key.startswith(prefix)
+        }
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or not self.persist:
+                return
+            text = json.dumps(self._steps, indent=1, sort_keys=True)
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.path, text)
+        except Exception as e:
+            logger.warning(f"Could not write flake stats {self.path}: {e}")
+
+
+FLAKE_STATS = FlakeStats()
+
+
+def with_timeout(message: Dict[str, Any], timeout_ms: int) -> Dict[str, Any]:
+    return {**message, "options": {**(message.get("options") or {}), "timeout": timeout_ms}}
+
+
+async def run_with_retries(
+    attempt: Callable[[Dict[str, Any]], Awaitable[Any]],
+    message: Dict[str, Any],
+    retries: int = 0,
+    retry_delay_ms: Optional[int] = None,
+    stats_key: Optional[str] = None,
+    stats: FlakeStats = FLAKE_STATS,
+) -> Tuple[Any, int]:
+    """
+    Call `attempt(message)` until it succeeds, it fails with a non-transient
+    error or `retries` retries are used up. Returns (result, attempts); the last
+    error is re-raised with `.attempts` set.
+
+    With a `stats_key`, the outcome is recorded, and a flaky step without an
+    explicit options.timeout runs with its tuned timeout.
+    """
+    options = message.get("options") or {}
+    # options.ms is waitTimeout's duration, which _get_timeout reads after options.timeout
+    if stats_key and options.get("timeout") is None and options.get("ms") is None:
+        tuned = stats.tuned_timeout(stats_key, message.get("action"))
+        if tuned:
+            message = with_timeout(message, tuned)
+    base_ms = DEFAULT_RETRY_DELAY_MS if retry_delay_ms is None else max(0, int(retry_delay_ms))
+    attempts = 0
+    while True:
+        attempts += 1
+        started = time.monotonic()
+        try:
+            result = await attempt(message)
+        except Exception as e:
+            transient = is_transient(e, message.get("action"))
+            if transient and attempts <= retries:
+                logger.debug(f"{message.get('action')}: transient error on attempt {attempts}, retrying: {e}")
+                await asyncio.sleep(backoff_delay(attempts - 1, base_ms))
+                continue
+            if stats_key:
+                stats.record(stats_key, message.get("action"), attempts, False, transient, 0)
+            e.attempts = attempts
+            raise
+        if stats_key:
+            stats.record(stats_key, message.get("action"), attempts, True, False, int((time.monotonic() - started) * 1000))
+        return result, attempts
@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import time
+
+# Playwright traces recorded per script run (open with `npx playwright show-trace <file>`)
+TRACES_DIR = Path(__file__).parent / "traces"
+
+# Actions whose target must be actionable (visible, enabled, stable) before they act
+INTERACTIVE_ACTIONS = {"click", "dblclick", "hover", "fill", "type", "press", "selectOption"}
+
+
+def _ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+
+def _selector(message: Dict[str, Any]) -> Optional[str]:
+    target = message.get("target") or {}
+    return target.get("selector") if isinstance(target, dict) else target
+
+
+async def run_timed(
+    page,
+    message: Dict[str, Any],
+    handler: Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    profile: bool = False,
+) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Run an action handler and return its details plus a phase breakdown in ms.
+
+    `actionMs` is always measured. With `profile`, selector resolution and
+    actionability waits are done up front and timed separately (`resolveMs`,
+    `actionabilityMs`), and a navigation started by the action is awaited up to
+    the load event (`navigationMs`). Profiling costs extra round-trips, so it is opt-in.
+    """
+    phases: Dict[str, int] = {}
+    try:
+        details = await _run_phases(page, message, handler, profile, phases)
+    except Exception as e:
+        # Keep the breakdown of a failed step for the error result
+        e.timing = phases
+        raise
+    return details or {}, phases
+
+
+async def _run_phases(page, message, handler, profile: bool, phases: Dict[str, int]):
+    selector = _selector(message)
+    timeout = int((message.get("options") or {}).get("timeout", 10000))
+
+    if profile and selector:
+        started = time.perf_counter()
+        await page.wait_for_selector(selector, state="attached", timeout=timeout)
+        phases["resolveMs"] = _ms(started)
+        if message.get("action") in INTERACTIVE_ACTIONS:
+            started = time.perf_counter()
+            await page.wait_for_selector(selector, state="visible", timeout=timeout)
+            phases["actionabilityMs"] = _ms(started)
+
+    navigated = []
+
+    def _on_navigated(frame):
+        if frame == page.main_frame:
+            navigated.append(frame.url)
+
+    if profile:
+        page.on("framenavigated", _on_navigated)
+    started = time.perf_counter()
+    try:
+        details = await handler(page, message)
+    finally:
+        phases["actionMs"] = _ms(started)
+        if profile:
+            page.remove_listener("framenavigated", _on_navigated)
+
+    if navigated and message.get("action") not in ("goto", "reload", "goBack", "goForward"):
+        started = time.perf_counter()
+        await page.wait_for_load_state("load", timeout=timeout)
+        phases["navigationMs"] = _ms(started)
+    return details
+
+
+async def start_trace(page, title: Optional[str] = None):
+    """Start recording a Playwright trace for the page's browser context."""
+    await page.context.tracing.start(screenshots=True, snapshots=True, sources=False, title=title)
+
+
+async def stop_trace(page, name: str) -> str:
+    """Stop tracing and write the archive to TRACES_DIR; returns its path."""
+    TRACES_DIR.mkdir(exist_ok=True)
+    path = TRACES_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.zip"
+    await page.context.tracing.stop(path=str(path))
+    return str(path)
@@ -0,0 +1,18 @@
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+
+def encode_binary_frame(header: Dict[str, Any], payload: bytes) -> bytes:
+    """
+    Pack a JSON header and a raw payload into one binary WebSocket frame:
+    4-byte big-endian header length, UTF-8 JSON header, payload bytes.
+    """
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return struct.pack(">I", len(head)) + head + payload
+
+
+def decode_binary_frame(frame: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Inverse of encode_binary_frame."""
+    (size,) = struct.unpack_from(">I", frame)
+    return json.loads(frame[4:4 + size].decode("utf-8")), frame[4 + size:]
@@ -0,0 +1,25 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of an already sorted list; None when empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(values_ms: Iterable[float]) -> Dict[str, Optional[float]]:
+    """Count, mean and p50/p95/p99/max of latencies in ms, rounded to 0.01 ms."""
+    values = sorted(values_ms)
+    if not values:
+        return {"n": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "n": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(values[-1], 2),
+    }
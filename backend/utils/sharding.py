@@ -0,0 +1,31 @@
+import heapq
+from typing import Dict, Iterable, List, Optional
+
+
+def balance_shards(
+    names: Iterable[str],
+    durations: Dict[str, float],
+    shard_count: int,
+    default_ms: Optional[float] = None,
+) -> List[List[str]]:
+    """
+    Split `names` into exactly `shard_count` buckets with similar total
+    duration; with fewer names than buckets, the surplus buckets stay empty.
+    Uses longest-processing-time-first: the slowest remaining item always goes
+    to the currently lightest bucket. Items without history are estimated with
+    `default_ms` (the median of the known durations if not given).
+    """
+    names = list(names)
+    shard_count = max(1, shard_count)
+    if default_ms is None:
+        known = sorted(durations[n] for n in names if n in durations)
+        default_ms = known[len(known) // 2] if known else 1000.0
+
+    ordered = sorted(names, key=lambda n: (-durations.get(n, default_ms), n))
+    heap = [(0.0, i) for i in range(shard_count)]
+    shards: List[List[str]] = [[] for _ in range(shard_count)]
+    for name in ordered:
+        load, i = heapq.heappop(heap)
+        shards[i].append(name)
+        heapq.heappush(heap, (load + durations.get(name, default_ms), i))
+    return shards
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.latency import summarize
+
+# How often the controller adjusts the number of running users
+CONTROL_INTERVAL = 0.5
+# Time given to running iterations to finish once the schedule is over
+DEFAULT_GRACE_S = 30
+
+Stage = Tuple[int, float]
+
+
+def parse_stages(value: str) -> List[Stage]:
+    """'10@30,50@60,0@10': ramp to 10 users over 30 s, then to 50 over 60 s, then down to 0 over 10 s."""
+    stages = []
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        users, _, seconds = part.partition("@")
+        try:
+            stages.append((int(users), float(seconds)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid stage '{part}' (expected users@seconds)")
+        if stages[-1][0] < 0 or stages[-1][1] < 0:
+            raise argparse.ArgumentTypeError(f"Invalid stage '{part}'")
+    if not stages:
+        raise argparse.ArgumentTypeError("No stages given")
+    return stages
+
+
+def target_users(stages: List[Stage], elapsed: float) -> Optional[int]:
+    """Users wanted `elapsed` seconds in (linear within a stage); None once the schedule is over."""
+    current = 0
+    for users, seconds in stages:
+        if elapsed < seconds:
+            return round(current + (users - current) * elapsed / seconds)
+        elapsed -= seconds
+        current = users
+    return None
+
+
+class StepStats:
+    """Per-step latencies and errors, for the whole run and for the current reporting interval."""
+
+    def __init__(self):
+        self.total: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.interval: Dict[str, List[float]] = {}
+        self.interval_errors: Dict[str, int] = {}
+        self.iterations = 0
+        self.failed_iterations = 0
+
+    def add(self, key: str, ms: float, ok: bool):
+        self.total.setdefault(key, []).append(ms)
+        self.interval.setdefault(key, []).append(ms)
+        if not ok:
+            self.errors[key] = self.errors.get(key, 0) + 1
+            self.interval_errors[key] = self.interval_errors.get(key, 0) + 1
+
+    def flush_interval(self) -> Dict[str, Dict[str, Any]]:
+        window = {
+            key: {**summarize(values), "errors": self.interval_errors.get(key, 0)}
+            for key, values in self.interval.items()
+        }
+        self.interval, self.interval_errors = {}, {}
+        return window
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {
+                **summarize(values),
+                "errors": self.errors.get(key, 0),
+                "errorRate": round(self.errors.get(key, 0) / len(values), 4),
+            }
+            for key, values in self.total.items()
+        }
+
+
+def _step_key(result: Dict[str, Any]) -> str:
+    return f"{result['index']:>3} {result.get('name') or result['action']}"
+
+
+async def run_load(args) -> Dict[str, Any]:
+    # Imported here so argument errors do not pay for Playwright start-up
+    from playwright.async_api import async_playwright
+    from message_processor import ACTION_HANDLERS
+    from playwright_manager import DEFAULT_VIEWPORT
+    from routing_profiles import resolve_profile, routing_for
+    from script_compiler import compile_script
+    from script_runner import run_steps
+
+    plan = compile_script(args.script, ACTION_HANDLERS)
+    profile = resolve_profile(plan.routing) if plan.routing is not None else None
+    stats = StepStats()
+    timeline: List[Dict[str, Any]] = []
+
+    async with async_playwright() as p:
+        browsers = [await p.chromium.launch(headless=not args.headed) for _ in range(args.browsers)]
+
+        async def virtual_user(number: int, stop: asyncio.Event):
+            browser = browsers[number % len(browsers)]
+
+            async def on_step(result: Dict[str, Any]):
+                stats.add(_step_key(result), result["details"].get("elapsedMs", 0), result["status"] == "ok")
+                if args.think_ms:
+                    await asyncio.sleep(args.think_ms / 1000)
+
+            while not stop.is_set():
+                # A fresh context per iteration: every journey starts without cookies or storage
+                context = None
+                try:
+                    context = await browser.new_context(viewport=DEFAULT_VIEWPORT)
+                    page = await context.new_page()
+                    if profile:
+                        await routing_for(page).set_profile(profile)
+                    summary = await run_steps(page, plan, ACTION_HANDLERS, on_step=on_step, include_stack=False, record_flakes=False)
+                    ok = summary["failed"] == 0
+                except Exception:
+                    ok = False
+                finally:
+                    if context:
+                        await context.close()
+                stats.iterations += 1
+                if not ok:
+                    stats.failed_iterations += 1
+                if args.pacing_ms:
+                    await asyncio.sleep(args.pacing_ms / 1000)
+
+        users: List[Tuple[asyncio.Task, asyncio.Event]] = []
+        started = time.monotonic()
+        next_report = started + args.report_interval
+        try:
+            while True:
+                now = time.monotonic()
+                wanted = target_users(args.stages, now - started)
+                if wanted is None:
+                    break
+                # Ramp up with new users; ramp down by letting the newest finish their iteration
+                active = [(t, s) for t, s in users if not s.is_set() and not t.done()]
+                for _ in range(wanted - len(active)):
+                    stop = asyncio.Event()
+                    users.append((asyncio.create_task(virtual_user(len(users), stop)), stop))
+                for _, stop in active[wanted:]:
+                    stop.set()
+                if now >= next_report:
+                    next_report += args.report_interval
+                    running = sum(1 for t, s in users if not s.is_set() and not t.done())
+                    timeline.append(_report_line(now - started, running, stats))
+                await asyncio.sleep(CONTROL_INTERVAL)
+        finally:
+            for _, stop in users:
+                stop.set()
+            pending = [t for t, _ in users if not t.done()]
+            if pending:
+                _, still_running = await asyncio.wait(pending, timeout=args.grace)
+                for task in still_running:
+                    task.cancel()
+                await asyncio.gather(*still_running, return_exceptions=True)
+            for browser in browsers:
+                await browser.close()
+
+    return {
+        "script": plan.name,
+        "browsers": args.browsers,
+        "peakUsers": max(n for n, _ in args.stages),
+        "durationS": round(time.monotonic() - started, 1),
+        "iterations": stats.iterations,
+        "failedIterations": stats.failed_iterations,
+        "steps": stats.summary(),
+        "timeline": timeline,
+    }
+
+
+def _report_line(elapsed: float, users: int, stats: StepStats) -> Dict[str, Any]:
+    window = stats.flush_interval()
+    count = sum(s["n"] for s in window.values())
+    errors = sum(s["errors"] for s in window.values())
+    print(f"[{elapsed:6.1f}s] users {users:>4}  iterations {stats.iterations:>6}  steps {count:>6}  errors {errors}")
+    for key, s in sorted(window.items()):
+        print(f"    {key:<28} p50 {s['p50']} ms  p95 {s['p95']} ms  p99 {s['p99']} ms  errors {s['errors']}/{s['n']}")
+    return {"atS": round(elapsed, 1), "users": users, "iterations": stats.iterations, "steps": window}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a saved script as concurrent virtual users (one browser context each).")
+    parser.add_argument("script", help="Saved script name")
+    parser.add_argument("-u", "--users", type=int, default=10, help="Concurrent virtual users (without --stages)")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Seconds to reach --users (without --stages)")
+    parser.add_argument("-d", "--duration", type=float, default=60, help="Seconds at full load (without --stages)")
+    parser.add_argument("--stages", type=parse_stages, help="Ramp schedule users@seconds,... e.g. 10@30,50@60,0@10")
+    parser.add_argument("-b", "--browsers", type=int, default=2, help="Shared headless browsers the users are spread over")
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause after every step")
+    parser.add_argument("--pacing-ms", type=float, default=0, help="Pause between a user's iterations")
+    parser.add_argument("--report-interval", type=float, default=5, help="Seconds between streamed reports")
+    parser.add_argument("--grace", type=float, default=DEFAULT_GRACE_S, help="Seconds running iterations may take to finish at the end")
+    parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    parser.add_argument("--json", dest="json_out", type=Path, help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.browsers < 1:
+        parser.error("--browsers must be at least 1")
+    if args.stages is None:
+        args.stages = [(args.users, args.ramp_up), (args.users, args.duration)]
+
+    report = asyncio.run(run_load(args))
+    print(f"\n{report['iterations']} iteration(s), {report['failedIterations']} failed, in {report['durationS']} s")
+    for key, s in sorted(report["steps"].items()):
+        print(f"    {key:<28} n={s['n']:<6} p50 {s['p50']} ms  p95 {s['p95']} ms  p99 {s['p99']} ms  error rate {s['errorRate']}")
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2), "utf-8")
+    return 1 if report["failedIterations"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,8 @@ class ExtensionWebSocket {
     this.maxReconnectAttempts = 5;
     this.reconnectDelay = 1000; // Start with 1 second
     this.pending = new Map(); // id -> {resolve, reject, timeoutId}
+    this.binaryFrames = new Map(); // id -> Blob received ahead of its result frame
+    this.onScreencastFrame = null; // (header, blob) => void, set while a screencast is running
     this.defaultTimeout = 30000; // 30s per command
     this.connect();
   }
@@ -14,13 +16,20 @@ class ExtensionWebSocket {
   connect() {
     try {
       this.ws = new WebSocket("ws://127.0.0.1:8000/ws");
+      this.ws.binaryType = 'arraybuffer';
 
       this.ws.onopen = () => {
         this.reconnectAttempts = 0;
         this.reconnectDelay = 1000;
+        // JSON stays the encoding here; skip the per-command "processing" frame and stack traces
+        this._send({ type: 'hello', encodings: ['json'], ack: false, stack: false });
       };
 
       this.ws.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+          this._onBinary(event.data);
+          return;
+        }
         let data = null;
         try {
           data = JSON.parse(event.data);
@@ -29,11 +38,25 @@ class ExtensionWebSocket {
           return;
         }
 
+        // Intermediate frames (e.g. step_result from runScript) go to the progress callback
+        if (data && data.type !== 'result' && data.id && this.pending.has(data.id)) {
+          const entry = this.pending.get(data.id);
+          if (entry.onProgress) {
+            this._armTimeout(data.id, entry);
+            try { entry.onProgress(data); } catch (e) { console.error("[EXT] Progress handler failed:", e); }
+          }
+          return;
+        }
+
         // Resolve pending promises by id for result messages
         if (data && data.type === 'result' && data.id && this.pending.has(data.id)) {
           const entry = this.pending.get(data.id);
           this.pending.delete(data.id);
-          clearTimeout(entry.timeoutId);
+          clearTimeout(entry.timer);
+          if (this.binaryFrames.has(data.id)) {
+            data.binary = this.binaryFrames.get(data.id);
+            this.binaryFrames.delete(data.id);
+          }
           if (data.status === 'ok') {
             entry.resolve(data);
           } else {
@@ -49,7 +72,7 @@ class ExtensionWebSocket {
         console.log("[EXT] WebSocket closed:", event.code, event.reason);
         // Reject all pending requests on close
         this.pending.forEach((entry, id) => {
-          clearTimeout(entry.timeoutId);
+          clearTimeout(entry.timer);
           entry.reject({ type: 'error', message: 'WebSocket closed', id });
         });
         this.pending.clear();
@@ -94,6 +117,31 @@ class ExtensionWebSocket {
     }
   }
 
+  // Binary frame layout: 4-byte big-endian header length, JSON header, payload (e.g. a screenshot)
+  _onBinary(buffer) {
+    try {
+      const view = new DataView(buffer);
+      const headerLength = view.getUint32(0);
+      const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+      const blob = new Blob([new Uint8Array(buffer, 4 + headerLength)], { type: header.mime || 'application/octet-stream' });
+      if (header.id && this.pending.has(header.id)) {
+        this.binaryFrames.set(header.id, blob);
+      } else if (header.type === 'screencastFrame' && this.onScreencastFrame) {
+        this.onScreencastFrame(header, blob);
+      }
+    } catch (e) {
+      console.error("[EXT] Failed to parse binary WebSocket frame:", e);
+    }
+  }
+
+  _armTimeout(id, entry) {
+    clearTimeout(entry.timer);
+    entry.timer = setTimeout(() => {
+      this.pending.delete(id);
+      entry.reject({ error: 'Timeout', message: `No reply after ${entry.timeoutMs}ms`, id });
+    }, entry.timeoutMs);
+  }
+
   sendCommand(payload, options = {}) {
     const id = Date.now() + '-' + Math.random().toString(36).substring(2, 8);
   
@@ -108,15 +156,19 @@ class ExtensionWebSocket {
         return;
       }
   
-      const timer = setTimeout(() => {
-        this.pending.delete(id);
-        reject({ error: 'Timeout', message: `No reply after ${timeoutMs}ms`, id });
-      }, timeoutMs);
-  
-      this.pending.set(id, { resolve, reject, timer });
+      // The timeout is re-armed on every progress frame, so long runs only fail when they stall
+      const entry = { resolve, reject, timeoutMs, onProgress: options.onProgress };
+      this._armTimeout(id, entry);
+      this.pending.set(id, entry);
     });
   }
 
+  // Several commands in one frame; resolves with one reply whose `results` holds each command's result
+  sendBatch(commands, options = {}) {
+    const items = commands.map((c, i) => ({ id: c.id || `${i}`, ...c }));
+    return this.sendCommand({ type: 'batch', commands: items, stopOnError: !!options.stopOnError }, options);
+  }
+
   close() {
     if (this.ws) {
       try { this.ws.close(); } catch {}
@@ -123,11 +123,29 @@
     async function playAll() {
       setRunningAll(true);
       try {
+        // Send the whole list in one command; the server streams a step_result per step
+        const batch = [];
         for (const s of steps) {
-          if (!s.enabled) continue;
-          const r = await playOne(s);
-          if (!r.ok && stopOnError) break;
+          // Disabled steps go along as placeholders the server skips, so step indices match the
+          // saved script (run history and flake statistics key unnamed steps by index)
+          if (!s.enabled) { batch.push({ action: s.action, uiId: s.id, enabled: false }); continue; }
+          const one = { action: s.action, uiId: s.id };
+          if (s.name) one.name = s.name;
+          if (s.selector) one.target = { selector: s.selector };
+          if (s.value !== '' && s.value !== undefined) one.value = s.value;
+          const opts = parseOptions(s.optionsText);
+          if (opts) one.options = opts;
+          if ((s.storeAs || '').trim()) one.storeAs = s.storeAs.trim();
+          batch.push(one);
+          updateStep(s.id, { status: 'processing', error: '' });
         }
+        const res = await sendToTab({ type: 'run_script', steps: batch, stopOnError, name: currentScriptName || undefined });
+        // Steps that never got a result (stopped early or connection lost) go back to idle
+        setSteps((arr) => arr.map(s => s.status === 'processing' ? {
+          ...s,
+          status: res && res.response ? 'idle' : 'error',
+          error: res && res.response ? '' : String(res?.error || 'Unknown error')
+        } : s));
       } finally {
         setRunningAll(false);
       }
@@ -33,7 +33,9 @@ if (!window.extensionWS) {
       action: step.action,
       ...(step.target && { target: interpolate(step.target) }),
       ...(step.value !== undefined && { value: interpolate(step.value) }),
-      ...(step.options && { options: interpolate(step.options) })
+      ...(step.options && { options: interpolate(step.options) }),
+      // Retried server-side on transient errors (timeouts, detached elements)
+      ...(step.retries && { retries: step.retries, retryDelayMs: step.retryDelayMs })
     };
     const res = await window.extensionWS.sendCommand(payload, { timeoutMs: step.timeoutMs });
     if (res?.status === 'ok' && step.storeAs) {
@@ -79,6 +81,30 @@ if (!window.extensionWS) {
   }
 
 
+  // Run a whole step list server-side in one command; step results stream back per step
+  // `name` is the open script's name, so the run is kept in that script's history
+  async function runScript(steps, stopOnError, name) {
+    function onProgress(frame) {
+      if (frame.type !== 'step_result') return;
+      const errorMsg = frame.status !== 'ok' ? (frame.error?.message || 'Unknown error') : '';
+      try {
+        chrome.runtime.sendMessage({
+          type: 'step_result',
+          index: frame.index,
+          status: frame.status,
+          error: errorMsg,
+          uiId: frame.uiId
+        });
+      } catch {}
+    }
+    const res = await window.extensionWS.sendCommand(
+      { action: 'runScript', options: { steps, stopOnError, vars: { ...vars }, ...(name ? { name } : {}) } },
+      { onProgress }
+    );
+    Object.assign(vars, res?.details?.vars || {});
+    return res;
+  }
+
   chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
     if (!msg || typeof msg !== 'object') return;
 
@@ -96,6 +122,13 @@ if (!window.extensionWS) {
       return true;
     }
 
+    if (msg.type === 'run_script' && Array.isArray(msg.steps)) {
+      runScript(msg.steps, msg.stopOnError !== false, msg.name)
+        .then(r => sendResponse({ ok: r?.details?.ok !== false, response: r }))
+        .catch(e => sendResponse({ ok: false, error: e?.error?.message || e?.message || String(e) }));
+      return true;
+    }
+
     if (msg.type === 'send_command' && msg.payload) {
       window.extensionWS.sendCommand(msg.payload, msg.options)
         .then(r => sendResponse({ ok: true, response: r }))